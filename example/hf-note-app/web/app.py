@@ -1,17 +1,62 @@
 import gradio as gr
 import os
+import re
 import json
-from huggingface_hub import HfApi, hf_hub_download
-from datetime import datetime
+import gzip
+import hashlib
+import tempfile
+import atexit
+from huggingface_hub import HfApi, hf_hub_download, hf_hub_url, get_hf_file_metadata, CommitOperationAdd, CommitOperationDelete
+from huggingface_hub.utils import EntryNotFoundError
+from datetime import datetime, timezone
 import shutil
+import bisect
+import threading
+import itertools
+import time
+import mimetypes
+from io import BytesIO
+import concurrent.futures
 from pathlib import Path
 from uuid import uuid4
 from zoneinfo import ZoneInfo
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+try:
+    from PIL import Image  # Gradio 自带 Pillow，用于生成附件缩略图
+except ImportError:
+    Image = None
 
 # --- 配置 (优先从环境变量读取) ---
 DATASET_REPO_ID = os.environ.get("DATASET_REPO_ID", "mingyang22/huggingface-notes")
 HF_TOKEN = os.environ.get("HF_TOKEN") # 必须在 Space 设置中配置
 REMOTE_NOTES_PATH = "db/notes.json"
+# 设为 gzip 时以 db/notes.json.gz 压缩上传 (C# 客户端仍读取未压缩的 db/notes.json，默认关闭)
+NOTES_CODEC = os.environ.get("NOTES_CODEC", "").lower()
+REMOTE_NOTES_GZ_PATH = REMOTE_NOTES_PATH + ".gz"
+# 设为 sharded 时每条笔记单独存为 db/notes/<id>.json，push/pull 只传输变化的笔记
+# (C# 客户端只认 db/notes.json，默认 single)
+NOTES_LAYOUT = os.environ.get("NOTES_LAYOUT", "single").lower()
+REMOTE_SHARD_DIR = "db/notes"
+REMOTE_SHARD_INDEX = f"{REMOTE_SHARD_DIR}/_index.json"
+SHARD_WORKERS = 8
+# 附件按内容 sha256 存为 attachments/<sha256>，元数据单独存在 db/attachments.json
+# (C# 客户端重写 notes.json 时会丢掉未知字段，所以不放进笔记本身)
+REMOTE_ATTACHMENT_DIR = "attachments"
+REMOTE_ATTACHMENT_INDEX = "db/attachments.json"
+ATTACHMENT_CACHE_MB = int(os.environ.get("NOTES_ATTACHMENT_CACHE_MB", "512"))
+THUMB_SIZE = 256
+# 后台同步状态的轮询间隔 (秒)
+SYNC_POLL_INTERVAL = float(os.environ.get("NOTES_SYNC_POLL_INTERVAL", "2"))
+# 退出时等待未完成备份的最长时间 (秒)
+SYNC_FLUSH_TIMEOUT = 30
+# 页面加载时，距上次成功拉取不超过该秒数则直接使用本地数据，不再访问云端
+PULL_TTL = int(os.environ.get("NOTES_PULL_TTL", "60"))
+# Gradio 队列的并发数；笔记读写有跨进程文件锁保护，可以调大或同时运行多个进程
+NOTES_CONCURRENCY = int(os.environ.get("NOTES_CONCURRENCY", "4"))
 BEIJING_TZ = ZoneInfo("Asia/Shanghai")
 
 PWA_HEAD = """
@@ -108,6 +153,27 @@ def get_default_data_dir():
 
 DATA_DIR = get_default_data_dir()
 LOCAL_NOTES_PATH = str(Path(DATA_DIR) / "notes.json")
+SYNC_STATE_PATH = str(Path(DATA_DIR) / "sync_state.json")
+# 分片布局的本地镜像：与云端 db/notes/ 内容逐字节一致，state.json 记录各分片 oid 与对应 commit
+SHARD_DIR = Path(DATA_DIR) / "shards"
+SHARD_STATE_PATH = SHARD_DIR / "state.json"
+# 日志模式：保存/置顶/删除只向 notes.journal.jsonl 追加一行，后台定期合并回 notes.json (NOTES_JOURNAL=0 关闭)
+NOTES_JOURNAL = os.environ.get("NOTES_JOURNAL", "1") != "0"
+JOURNAL_PATH = str(Path(DATA_DIR) / "notes.journal.jsonl")
+COMPACT_INTERVAL = int(os.environ.get("NOTES_COMPACT_INTERVAL", "60"))  # 秒
+COMPACT_MAX_RECORDS = 500  # 日志超过该条数时立即合并
+# 附件本地缓存：按需下载，总大小超过 ATTACHMENT_CACHE_MB 时淘汰最久未访问的
+ATTACHMENT_DIR = Path(DATA_DIR) / "attachments"
+ATTACHMENT_INDEX_PATH = Path(DATA_DIR) / "attachments.json"
+
+# 笔记 id 会直接拼进本地分片路径，只接受 uuid4().hex / C# Guid 这类字母数字与 - _ 组成的 id
+NOTE_ID_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,127}")
+
+def shard_path(note_id):
+    """笔记在本地分片镜像中的路径；id 含路径分隔符、.. 等不合法字符时抛出 ValueError。"""
+    if not NOTE_ID_RE.fullmatch(note_id):
+        raise ValueError(f"非法的笔记 id: {note_id!r}")
+    return SHARD_DIR / f"{note_id}.json"
 
 def ensure_local_notes():
     Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
@@ -115,64 +181,768 @@ def ensure_local_notes():
     if not p.exists():
         p.write_text("[]", encoding="utf-8")
 
-def read_notes():
-    ensure_local_notes()
+def normalize_note(item):
+    # 关键修复：同时支持 C# 风格 (Uppercase) 和 Python 风格 (Lowercase) 的键名
+    n_id = item.get("Id") or item.get("id", "")
+    n_title = item.get("Title") or item.get("title", "")
+    n_content = item.get("Content") or item.get("content", "")
+    n_updated = item.get("UpdatedAt") or item.get("updated_at", "")
+    n_pinned = item.get("IsPinned") if "IsPinned" in item else item.get("is_pinned", False)
+    n_deleted = item.get("IsDeleted") if "IsDeleted" in item else item.get("is_deleted", False)
+
+    return {
+        "id": str(n_id),
+        "title": str(n_title),
+        "content": str(n_content),
+        "updated_at": str(n_updated),
+        "is_pinned": bool(n_pinned),
+        "is_deleted": bool(n_deleted)
+    }
+
+def parse_notes(raw):
     try:
-        data = json.loads(Path(LOCAL_NOTES_PATH).read_text(encoding="utf-8-sig"))
+        data = json.loads(raw.decode("utf-8-sig") if isinstance(raw, bytes) else raw)
         if isinstance(data, list):
-            valid_notes = []
-            for item in data:
-                if not isinstance(item, dict): continue
-                # 关键修复：同时支持 C# 风格 (Uppercase) 和 Python 风格 (Lowercase) 的键名
-                n_id = item.get("Id") or item.get("id", "")
-                n_title = item.get("Title") or item.get("title", "")
-                n_content = item.get("Content") or item.get("content", "")
-                n_updated = item.get("UpdatedAt") or item.get("updated_at", "")
-                n_pinned = item.get("IsPinned") if "IsPinned" in item else item.get("is_pinned", False)
-                n_deleted = item.get("IsDeleted") if "IsDeleted" in item else item.get("is_deleted", False)
-
-                valid_notes.append({
-                    "id": str(n_id),
-                    "title": str(n_title),
-                    "content": str(n_content),
-                    "updated_at": str(n_updated),
-                    "is_pinned": bool(n_pinned),
-                    "is_deleted": bool(n_deleted)
-                })
-            return valid_notes
+            return [normalize_note(item) for item in data if isinstance(item, dict)]
     except Exception as e:
         print(f"读取笔记失败: {e}")
     return []
 
+def dump_notes(notes):
+    # 与 HFNoteSync.cs 的 SerializeNotesUnified 相同的统一格式
+    return json.dumps(notes, ensure_ascii=False, indent=2)
+
 def write_notes(notes):
     ensure_local_notes()
-    Path(LOCAL_NOTES_PATH).write_text(
-        json.dumps(notes, ensure_ascii=False, indent=2),
-        encoding="utf-8",
-    )
+    write_bytes_atomic(LOCAL_NOTES_PATH, dump_notes(notes).encode("utf-8"))
+
+def read_sync_state():
+    try:
+        data = json.loads(Path(SYNC_STATE_PATH).read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def write_sync_state(state):
+    Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+    write_bytes_atomic(SYNC_STATE_PATH, json.dumps(state, ensure_ascii=False, indent=2).encode("utf-8"))
+
+def local_oids(path):
+    """本地文件的 sha256 与 git blob sha1，分别对应云端 LFS 文件和普通文件的 etag。"""
+    data = Path(path).read_bytes()
+    git_oid = hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+    return hashlib.sha256(data).hexdigest(), git_oid
+
+def git_oid(data):
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def shard_bytes(note):
+    # 单条笔记，字段与统一格式相同；固定序列化方式，内容不变时 oid 不变
+    return json.dumps(note, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8")
+
+def note_version(note):
+    """笔记内容的短摘要，编辑器打开笔记时记下，保存时据此发现其他窗口/进程的并发修改。"""
+    return hashlib.sha1(shard_bytes(note)).hexdigest()[:16]
+
+def index_bytes(shards):
+    return json.dumps({"format": 1, "shards": shards}, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def read_shard_state():
+    try:
+        data = json.loads(SHARD_STATE_PATH.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def write_shard_state(state):
+    SHARD_DIR.mkdir(parents=True, exist_ok=True)
+    write_bytes_atomic(SHARD_STATE_PATH, json.dumps(state).encode("utf-8"))
+
+def write_bytes_atomic(dst, data):
+    fd, tmp = tempfile.mkstemp(dir=str(Path(dst).parent), prefix=".notes.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+class FileLock:
+    """
+    跨进程的排他文件锁（POSIX 用 fcntl.flock，Windows 用 msvcrt.locking），同时兼作进程内的可重入锁：
+    同一线程可以嵌套进入，只有最外层才真正加锁/解锁文件。
+    """
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.RLock()
+        self._depth = 0
+        self._fh = None
+
+    def __enter__(self):
+        self._local.acquire()
+        try:
+            if self._depth == 0:
+                if self._fh is None:
+                    Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+                    self._fh = open(self.path, "a+b")
+                self._lock_file()
+            self._depth += 1
+        except BaseException:
+            self._local.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        try:
+            if self._depth == 0:
+                self._unlock_file()
+        finally:
+            self._local.release()
+        return False
+
+    def _lock_file(self):
+        if fcntl:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+            return
+        self._fh.seek(0)
+        while True:
+            try:
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_NBLCK, 1)
+                return
+            except OSError:
+                threading.Event().wait(0.05)
+
+    def _unlock_file(self):
+        if fcntl:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        else:
+            self._fh.seek(0)
+            msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+def install_file_atomic(src, dst, opener=open):
+    """先复制到目标旁的临时文件并 fsync，再原子 rename，进程被杀也不会留下半个文件。
+    opener 传 gzip.open 时边解压边写入。"""
+    fd, tmp = tempfile.mkstemp(dir=str(Path(dst).parent), prefix=".notes.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fdst, opener(src, "rb") as fsrc:
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+            fdst.flush()
+            os.fsync(fdst.fileno())
+        os.replace(tmp, dst)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
 
 def now_beijing():
     return datetime.now(BEIJING_TZ)
 
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+# --- 笔记内存索引 ---
+PAGE_SIZE = int(os.environ.get("NOTES_PAGE_SIZE", "50"))
+
+def sort_key(note):
+    # 列表顺序：置顶优先，时间倒序；id 作为最后的比较项，保证顺序稳定
+    return (note["is_pinned"], note["updated_at"], note["id"])
+
+def in_filter(note, filter_type):
+    # Tab 过滤
+    if filter_type == "trash":
+        return note["is_deleted"]
+    if note["is_deleted"]:
+        return False
+    return filter_type != "pinned" or note["is_pinned"]
+
+def note_row(note):
+    return [note["id"], f"{'📌 ' if note['is_pinned'] else ''}{note['title'] or '未命名'}", note["updated_at"]]
+
+# 中日韩字符连续成段（按单字与二元组索引），其余字母数字按词索引
+CJK_CHARS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+TOKEN_RE = re.compile(f"([{CJK_CHARS}]+)|([^\\W_{CJK_CHARS}]+)")
+
+def tokenize(text):
+    """返回 [(是否 CJK, 片段)]，片段已转小写。"""
+    return [(bool(cjk), cjk or word) for cjk, word in TOKEN_RE.findall(text.lower())]
+
+def index_terms(text):
+    terms = set()
+    # 先对片段去重，长文里重复出现的词只切分一次
+    for cjk, word in set(TOKEN_RE.findall(text.lower())):
+        if cjk:
+            terms.update(cjk)
+            terms.update(a + b for a, b in zip(cjk, cjk[1:]))
+        else:
+            terms.add(word)
+    return terms
+
+class SearchIndex:
+    """
+    笔记标题+正文的倒排索引，随保存/删除增量更新。
+    查询按空白拆成多个词取交集 (AND)：拉丁词按前缀匹配，中日韩片段按单字/二元组匹配，
+    三字以上的片段再对候选做一次子串校验，排除二元组拼接造成的误命中。
+    """
+    def __init__(self):
+        self._postings = {}  # term -> {note_id}
+        self._doc_terms = {}  # note_id -> {term}
+        self._vocab = []     # 有序词表，用于前缀查找
+
+    def update(self, note_id, text):
+        terms = index_terms(text)
+        old = self._doc_terms.get(note_id, set())
+        for term in old - terms:
+            self._discard(term, note_id)
+        for term in terms - old:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = set()
+                bisect.insort(self._vocab, term)
+            postings.add(note_id)
+        self._doc_terms[note_id] = terms
+
+    def remove(self, note_id):
+        for term in self._doc_terms.pop(note_id, ()):
+            self._discard(term, note_id)
+
+    def _discard(self, term, note_id):
+        postings = self._postings[term]
+        postings.discard(note_id)
+        if not postings:
+            del self._postings[term]
+            del self._vocab[bisect.bisect_left(self._vocab, term)]
+
+    def _prefix(self, prefix):
+        matched = set()
+        pos = bisect.bisect_left(self._vocab, prefix)
+        while pos < len(self._vocab) and self._vocab[pos].startswith(prefix):
+            matched |= self._postings[self._vocab[pos]]
+            pos += 1
+        return matched
+
+    def search(self, query):
+        """返回 (候选 id 集合, 需要子串校验的 CJK 片段列表)。查询为空时返回 (None, [])。"""
+        result = None
+        verify = []
+        for is_cjk, piece in tokenize(query):
+            if not is_cjk:
+                ids = self._prefix(piece)
+            elif len(piece) <= 2:
+                ids = self._postings.get(piece, set())
+            else:
+                grams = sorted((self._postings.get(piece[i:i + 2], set()) for i in range(len(piece) - 1)), key=len)
+                ids = set.intersection(*grams)
+                verify.append(piece)
+            result = set(ids) if result is None else result & ids
+            if not result:
+                return set(), []
+        return result, verify
+
+class VersionConflict(Exception):
+    """保存时笔记已被其他窗口或进程修改。current 为当前版本的笔记。"""
+    def __init__(self, current):
+        super().__init__(current["id"])
+        self.current = current
+
+class NoteStore:
+    """
+    进程内共享的笔记缓存：规范化后的笔记按 id 建字典索引，并维护一份按列表顺序排好的 id 序列。
+    仅在 notes.json 的 mtime/size 变化（例如云端拉取覆盖了文件）时才重新解析。
+
+    指定 journal_path 时为日志模式：notes.json 作为快照，每次写入只追加一行 JSONL 记录，
+    读取时把日志重放到快照上；compact() 把当前状态写成新快照并清空日志。
+    日志首行记录所基于快照的 sha256，快照被外部替换（如云端拉取）后旧日志自动作废。
+
+    所有读写都在 <path>.lock 文件锁内进行，多个进程可以共用同一个数据目录：
+    每次访问先检查快照与日志的变化，其他进程追加的日志只增量重放新增的部分。
+    """
+    VIEW_CACHE_SIZE = 64
+
+    def __init__(self, path, journal_path=None):
+        self.path = path
+        self.journal_path = journal_path
+        self._lock = FileLock(f"{path}.lock")
+        self._signature = ()   # 尚未加载；文件不存在时 _stat() 返回 None，两者不同
+        self._snapshot_sha = None
+        self._journal_records = 0
+        self._journal_offset = 0  # 已重放到的日志字节位置
+        self._notes = {}       # id -> note
+        self._file_order = []  # 写回文件时的顺序（新笔记插在最前，与原 write_notes 行为一致）
+        self._sorted = []      # [(sort_key, id)]，升序；列表展示时倒序遍历
+        self._views = {}       # (filter, query) -> [(sort_key, id)]，与 _sorted 同序，只含匹配的笔记
+        self._index = None     # SearchIndex，首次搜索时构建，之后随写入增量维护
+        self._compact_wakeup = threading.Event()
+        self._compactor = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            return None
+
+    def _refresh(self):
+        signature = self._stat()
+        if signature != self._signature:
+            self._load(signature)
+        elif self.journal_path:
+            self._catch_up()
+
+    def _load(self, signature):
+        ensure_local_notes()
+        raw = Path(self.path).read_bytes()
+        notes = parse_notes(raw)
+        self._notes = {n["id"]: n for n in notes}
+        self._file_order = [n["id"] for n in notes]
+        self._snapshot_sha = hashlib.sha256(raw).hexdigest()
+        if self.journal_path:
+            self._replay_journal()
+        self._sorted = sorted((sort_key(n), n["id"]) for n in self._notes.values())
+        self._views.clear()
+        self._index = None
+        self._signature = self._stat() if signature is None else signature
+
+    def _replay_journal(self):
+        self._journal_records = 0
+        self._journal_offset = 0
+        try:
+            raw = Path(self.journal_path).read_bytes()
+        except FileNotFoundError:
+            return
+        lines = raw.split(b"\n")
+        try:
+            header = json.loads(lines[0]) if len(lines) > 1 else {}
+        except ValueError:
+            header = {}
+        if header.get("snapshot") != self._snapshot_sha:
+            if raw:
+                print("笔记日志与当前快照不匹配（快照已被替换），丢弃旧日志")
+            os.remove(self.journal_path)
+            return
+        offset = len(lines[0]) + 1
+        # 最后一段没有换行符，是空串或进程中断时留下的半行，不重放
+        for line in lines[1:-1]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self._apply(record)
+            self._journal_records += 1
+            offset += len(line) + 1
+        self._journal_offset = offset
+
+    def _catch_up(self):
+        """快照未变而日志变长时，只重放其他进程新追加的记录。"""
+        try:
+            size = os.path.getsize(self.journal_path)
+        except FileNotFoundError:
+            size = 0
+        if size == self._journal_offset:
+            return
+        if size < self._journal_offset or self._journal_offset == 0:
+            # 日志被截断或刚由其他进程新建，整体重新加载
+            self._load(self._stat())
+            return
+        with open(self.journal_path, "rb") as f:
+            f.seek(self._journal_offset)
+            data = f.read()
+        pos = 0
+        while True:
+            end = data.find(b"\n", pos)
+            if end < 0:
+                break
+            try:
+                record = json.loads(data[pos:end])
+            except ValueError:
+                break
+            self._apply_live(record)
+            self._journal_records += 1
+            pos = end + 1
+        self._journal_offset += pos
+
+    def _apply(self, record):
+        if record.get("op") == "put":
+            note = record["note"]
+            if note["id"] not in self._notes:
+                self._file_order.insert(0, note["id"])
+            self._notes[note["id"]] = note
+        elif record.get("op") == "del" and record.get("id") in self._notes:
+            del self._notes[record["id"]]
+            self._file_order.remove(record["id"])
+
+    def _apply_live(self, record):
+        """应用一条变更，并同步维护排序序列、列表视图和搜索索引。"""
+        if record.get("op") == "put":
+            note = record["note"]
+            old = self._notes.get(note["id"])
+            if old:
+                self._unindex(old)
+            self._apply(record)
+            bisect.insort(self._sorted, (sort_key(note), note["id"]))
+            self._patch_views(old, note)
+            if self._index is not None:
+                self._index.update(note["id"], f"{note['title']}\n{note['content']}")
+        elif record.get("op") == "del":
+            note = self._notes.get(record.get("id"))
+            if not note:
+                return
+            self._unindex(note)
+            self._patch_views(note, None)
+            if self._index is not None:
+                self._index.remove(note["id"])
+            self._apply(record)
+
+    def _patch_views(self, old, new):
+        """
+        单条笔记变化后就地调整各个缓存视图：纯 Tab 视图用 bisect 移除旧位置、插入新位置；
+        带搜索词的视图是否命中取决于内容，直接丢弃，下次查询时重建。
+        """
+        for key in list(self._views):
+            filter_type, query = key
+            if query:
+                del self._views[key]
+                continue
+            view = self._views[key]
+            if old and in_filter(old, filter_type):
+                pos = bisect.bisect_left(view, (sort_key(old), old["id"]))
+                if pos < len(view) and view[pos][1] == old["id"]:
+                    del view[pos]
+            if new and in_filter(new, filter_type):
+                bisect.insort(view, (sort_key(new), new["id"]))
+
+    def _persist(self, record):
+        """写入一次变更：日志模式追加一行，否则整体重写 notes.json。"""
+        if not self.journal_path:
+            write_notes([self._notes[i] for i in self._file_order])
+            self._signature = self._stat()
+            return
+        with open(self.journal_path, "ab") as f:
+            if f.tell() != self._journal_offset:
+                # 末尾是进程中断留下的半行，截掉后再追加，保证后续记录都能被重放
+                f.truncate(self._journal_offset)
+            if self._journal_offset == 0:
+                f.write((json.dumps({"snapshot": self._snapshot_sha}) + "\n").encode("utf-8"))
+            f.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            self._journal_offset = f.tell()
+        self._journal_records += 1
+        self._start_compactor()
+        if self._journal_records >= COMPACT_MAX_RECORDS:
+            self._compact_wakeup.set()
+
+    def compact(self):
+        """把内存中的当前状态原子写为新快照并清空日志。返回是否实际写入。"""
+        with self._lock:
+            self._refresh()
+            if not self.journal_path or not os.path.exists(self.journal_path):
+                return False
+            raw = dump_notes([self._notes[i] for i in self._file_order]).encode("utf-8")
+            fd, tmp = tempfile.mkstemp(dir=str(Path(self.path).parent), prefix=".notes.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(raw)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            # 若在这里中断，日志首行的 sha 与新快照不符，下次加载时会被丢弃，数据不会重复应用
+            os.remove(self.journal_path)
+            self._snapshot_sha = hashlib.sha256(raw).hexdigest()
+            self._signature = self._stat()
+            self._journal_records = 0
+            self._journal_offset = 0
+            return True
+
+    def _start_compactor(self):
+        if self._compactor is None:
+            self._compactor = threading.Thread(target=self._compact_loop, name="note-compactor", daemon=True)
+            self._compactor.start()
+
+    def _compact_loop(self):
+        while True:
+            self._compact_wakeup.wait(COMPACT_INTERVAL)
+            self._compact_wakeup.clear()
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"笔记日志合并失败: {e}")
+
+    def _unindex(self, note):
+        pos = bisect.bisect_left(self._sorted, (sort_key(note), note["id"]))
+        if pos < len(self._sorted) and self._sorted[pos][1] == note["id"]:
+            del self._sorted[pos]
+
+    def replace_all(self, notes):
+        """用给定的笔记整体替换本地数据：原子写入新快照并清空日志。"""
+        with self._lock:
+            write_bytes_atomic(self.path, dump_notes(notes).encode("utf-8"))
+            if self.journal_path and os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._signature = ()
+            self._refresh()
+
+    def merge_remote(self, remote_notes, base=None):
+        """在锁内把云端笔记合并进本地（见 merge_notes）并写回，合并期间的本地写入不会丢失。"""
+        with self._lock:
+            merged, stats = merge_notes(self.snapshot(), remote_notes, base)
+            self.replace_all(merged)
+            return merged, stats
+
+    def snapshot(self):
+        """按文件顺序返回全部笔记的副本。"""
+        with self._lock:
+            self._refresh()
+            return [dict(self._notes[i]) for i in self._file_order]
+
+    def get(self, note_id):
+        with self._lock:
+            self._refresh()
+            note = self._notes.get(note_id)
+            return dict(note) if note else None
+
+    def put(self, note):
+        """新增或整体替换一条笔记并写回磁盘。"""
+        with self._lock:
+            self._refresh()
+            record = {"op": "put", "note": note}
+            self._apply_live(record)
+            self._persist(record)
+
+    def update(self, note_id, expected_version=None, **fields):
+        """
+        修改已有笔记的部分字段，笔记不存在时返回 None。
+        :param expected_version: 调用方读取笔记时的 note_version；与当前版本不同且要写入的内容确有差异时
+            抛出 VersionConflict，不写入。内容 (updated_at 以外的字段) 已与当前笔记一致时视为成功，原样返回当前笔记
+        """
+        with self._lock:
+            self._refresh()
+            note = self._notes.get(note_id)
+            if not note:
+                return None
+            if expected_version and note_version(note) != expected_version:
+                # 同一编辑器的失焦保存与点击保存会带着同一个旧 version 先后到达，第二次的内容与当前一致
+                if all(note.get(k) == v for k, v in fields.items() if k != "updated_at"):
+                    return dict(note)
+                raise VersionConflict(dict(note))
+            note = {**note, **fields}
+            self.put(note)
+            return note
+
+    def remove(self, note_id):
+        with self._lock:
+            self._refresh()
+            if note_id not in self._notes:
+                return False
+            record = {"op": "del", "id": note_id}
+            self._apply_live(record)
+            self._persist(record)
+            return True
+
+    def _search(self, query):
+        """按列表顺序返回匹配查询的笔记；查询为空时返回全部。"""
+        if not query.strip():
+            return (self._notes[note_id] for _, note_id in reversed(self._sorted))
+        if self._index is None:
+            self._index = SearchIndex()
+            for n in self._notes.values():
+                self._index.update(n["id"], f"{n['title']}\n{n['content']}")
+        ids, verify = self._index.search(query)
+        if ids is None:
+            # 查询里没有可索引的字符（只有标点等），退回到子串匹配
+            return (n for n in self._search("")
+                    if query in n["title"].lower() or query in n["content"].lower())
+        if len(ids) * 8 > len(self._sorted):
+            # 命中范围很大时，沿已排好的顺序过滤比对候选集排序更快
+            matched = (self._notes[note_id] for _, note_id in reversed(self._sorted) if note_id in ids)
+        else:
+            matched = sorted((self._notes[i] for i in ids), key=sort_key, reverse=True)
+        if verify:
+            return [n for n in matched
+                    if all(p in n["title"].lower() or p in n["content"].lower() for p in verify)]
+        return matched
+
+    def _view(self, filter_type, query):
+        key = (filter_type, query)
+        view = self._views.get(key)
+        if view is None:
+            matched = [(sort_key(n), n["id"]) for n in self._search(query) if in_filter(n, filter_type)]
+            matched.reverse()
+            if len(self._views) >= self.VIEW_CACHE_SIZE:
+                # 只淘汰搜索视图，三个 Tab 视图常驻并持续就地更新
+                for k in [k for k in self._views if k[1]]:
+                    del self._views[k]
+            view = self._views[key] = matched
+        return view
+
+    def list_page(self, filter_type="all", search_query="", page=0, page_size=PAGE_SIZE):
+        """
+        只渲染一页列表行。页码越界时自动收敛到最后一页。
+        :return: (rows, ids, page, total)，ids 与 rows 一一对应，供界面按行号反查笔记 id
+        """
+        query = search_query.lower() if search_query else ""
+        with self._lock:
+            self._refresh()
+            view = self._view(filter_type, query)
+            total = len(view)
+            page = max(0, min(page, (total - 1) // page_size)) if total else 0
+            # 视图为升序，第 0 页对应末尾的 page_size 条
+            end = total - page * page_size
+            chunk = view[max(0, end - page_size):end]
+            ids = [note_id for _, note_id in reversed(chunk)]
+            return [note_row(self._notes[i]) for i in ids], ids, page, total
+
+note_store = NoteStore(LOCAL_NOTES_PATH, journal_path=JOURNAL_PATH if NOTES_JOURNAL else None)
+# 正常退出时把日志合并回 notes.json，其他工具（如 C# 客户端）看到的总是完整快照
+atexit.register(note_store.compact)
+
+# --- 同步引擎 ---
+def parse_updated(raw, assume_utc=False):
+    """
+    与 HFNoteSync.cs 的 ParseDateSafe 一致的时间解析，返回时间戳（无法解析时为 -inf，相当于 DateTime.MinValue）。
+    不带时区的 "yyyy-MM-dd HH:mm:ss" 在云端数据中按 UTC、本地数据中按北京时间处理；其余不带时区的一律按北京时间。
+    """
+    raw = (raw or "").strip()
+    if not raw:
+        return float("-inf")
+    try:
+        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+    except ValueError:
+        return float("-inf")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc if assume_utc and "T" not in raw else BEIJING_TZ)
+    return dt.timestamp()
+
+def merge_notes(local, remote, base=None):
+    """
+    按笔记合并本地与云端，规则与 HFNoteSync.cs 的 MergeNotesByLatest 相同：
+    id 不区分大小写；UpdatedAt 较新的一方胜出，时间相同时保留本地。
+    另外两点补充（C# 客户端删除笔记不更新 UpdatedAt；本应用置顶、移入回收站都会更新 UpdatedAt，才能在时间比较中胜出）：
+    - 时间相同而一方已移入回收站时，以删除为准，删除才能同步到另一端；
+    - base 为上次同步时双方共有的 {id(小写): updated_at}，据此识别"彻底删除"：
+      上次同步后本地彻底删除的笔记不会被云端副本复活，云端彻底删除且本地未再修改的笔记也随之删除。
+    全程基于 id 字典，O(n)。
+    :return: (合并后的笔记列表（置顶优先、时间倒序）, 统计)
+    """
+    # 本地为空（新设备或数据目录被清空）时不能据 base 判定彻底删除，否则会删光云端
+    base = (base or {}) if local else {}
+    merged = {}
+    ts = {}
+    parsed_local = {}
+    for n in local:
+        if n["id"].strip():
+            key = n["id"].lower()
+            merged[key] = n
+            raw = n["updated_at"]
+            t = parsed_local.get(raw)
+            if t is None:
+                t = parsed_local[raw] = parse_updated(raw)
+            ts[key] = t
+    stats = {"remote_new": 0, "remote_newer": 0, "local_kept": 0, "removed": 0}
+    seen = set()
+    for r in remote:
+        if not r["id"].strip():
+            continue
+        key = r["id"].lower()
+        seen.add(key)
+        l = merged.get(key)
+        raw = r["updated_at"]
+        # 两端未改动的笔记时间字符串相同；带 "T" 的格式与来源无关，可直接复用本地的解析结果
+        if l is not None and raw == l["updated_at"] and "T" in raw:
+            rt = ts[key]
+        else:
+            rt = parse_updated(raw, assume_utc=True)
+        if l is None:
+            # 本地彻底删除的笔记：云端在上次同步后又修改过 (时间与 base 不同) 时保留云端的修改
+            if base.get(key) == raw:
+                stats["removed"] += 1
+                continue
+            merged[key], ts[key] = r, rt
+            stats["remote_new"] += 1
+        elif rt > ts[key] or (rt == ts[key] and r["is_deleted"] and not l["is_deleted"]):
+            merged[key], ts[key] = r, rt
+            stats["remote_newer"] += 1
+        else:
+            stats["local_kept"] += 1
+    for key in [k for k in merged if k not in seen and k in base]:
+        if base[key] == merged[key]["updated_at"]:
+            del merged[key]
+            stats["removed"] += 1
+    order = sorted(((merged[k]["is_pinned"], ts[k], k) for k in merged), reverse=True)
+    return [merged[k] for _, _, k in order], stats
+
+def format_merge_stats(stats):
+    return f"云端新增 {stats['remote_new']}，云端更新 {stats['remote_newer']}，彻底删除 {stats['removed']}"
+
+def base_of(notes):
+    return {n["id"].lower(): n["updated_at"] for n in notes}
+
 # --- 持久化管理 ---
 class CloudSync:
+    """
+    拉取 -> 合并 -> 推送的同步循环。记住上次同步的 commit 与文件 etag，
+    云端没有变化时一次拉取只需一次 HEAD 请求；推送以该 commit 作为 parent，
+    期间云端若有新提交会被拒绝 (412)，此时重新拉取合并后再推送。
+    """
+    PUSH_ATTEMPTS = 3
+
     def __init__(self):
         self.api = HfApi(token=HF_TOKEN)
-    
+        # 后台推送与界面上的手动拉取可能同时发生（多进程时也一样），同一时刻只跑一个同步
+        self._lock = FileLock(Path(DATA_DIR) / "sync.lock")
+
+    def _head(self, path):
+        return get_hf_file_metadata(
+            hf_hub_url(DATASET_REPO_ID, path, repo_type="dataset", revision="main"),
+            token=HF_TOKEN,
+        )
+
+    def _download(self, path, revision):
+        return hf_hub_download(
+            repo_id=DATASET_REPO_ID,
+            filename=path,
+            repo_type="dataset",
+            token=HF_TOKEN,
+            revision=revision,
+        )
+
+    def _record(self, key, entry, notes):
+        """
+        记录同步位置。notes 必须是此刻云端确实存在的笔记 (拉取到的云端全集或刚推送成功的全集)，
+        它会成为下次合并的 base；若混入尚未推送的本地笔记，下次拉取时它们会被误判为"云端已删除"。
+        """
+        state = read_sync_state()
+        state[key] = entry
+        state["base"] = base_of(notes)
+        write_sync_state(state)
+
     def pull(self):
+        with self._lock:
+            return self._pull()
+
+    def _pull(self):
         try:
             ensure_local_notes()
-            print(f"🔄 正在从 Dataset {DATASET_REPO_ID} 拉取 {REMOTE_NOTES_PATH}...")
-            downloaded_path = hf_hub_download(
-                repo_id=DATASET_REPO_ID,
-                filename=REMOTE_NOTES_PATH,
-                repo_type="dataset",
-                token=HF_TOKEN,
-                force_download=True,
-                revision="main",
-            )
-            shutil.copy(downloaded_path, LOCAL_NOTES_PATH)
-            return True, f"✅ 云端拉取同步完成"
+            commit, msg = self._sync_down()
+            try:
+                attachment_store.sync_down(commit)
+            except Exception as e:
+                print(f"附件索引同步失败: {e}")
+            return True, msg
+        except EntryNotFoundError:
+            return True, "✅ 云端暂无笔记"
         except Exception as e:
             msg = str(e)
             print(f"拉取失败详情: {msg}")
@@ -181,79 +951,635 @@ class CloudSync:
                 return False, f"⚠️ 拉取失败: 请检查 Space 的 HF_TOKEN 是否已正确配置 (Dataset 可能为私有)"
             return False, f"⚠️ 拉取失败: {msg}"
 
+    def _sync_down(self):
+        """
+        把云端的新改动合并进本地。返回 (云端当前 commit, 提示信息)；云端还没有笔记时抛出 EntryNotFoundError。
+        """
+        if NOTES_LAYOUT == "sharded":
+            try:
+                return self._pull_sharded()
+            except EntryNotFoundError:
+                print("云端尚无分片布局，回退到单文件拉取（下次推送时自动迁移）")
+        try:
+            # 先用一次 HEAD 请求比对云端 etag，与上次同步时相同则无需下载
+            remote_path, meta = self._resolve_remote()
+        except EntryNotFoundError:
+            # 其他设备已迁移到分片布局
+            return self._pull_sharded()
+        state = read_sync_state()
+        known = state.get(REMOTE_NOTES_PATH, {})
+        if meta.etag == known.get("etag") or meta.etag in known.get("oids", []):
+            return meta.commit_hash, "✅ 云端无变化，已是最新"
+        if remote_path == REMOTE_NOTES_PATH:
+            # 本地快照文件与云端逐字节相同：base 取这份文件的内容，不含日志里尚未推送的修改
+            data = Path(LOCAL_NOTES_PATH).read_bytes()
+            if meta.etag in (hashlib.sha256(data).hexdigest(), git_oid(data)):
+                self._record(REMOTE_NOTES_PATH, {"commit": meta.commit_hash, "etag": meta.etag, "path": remote_path},
+                             parse_notes(data))
+                return meta.commit_hash, "✅ 云端无变化，已是最新"
+
+        print(f"🔄 正在从 Dataset {DATASET_REPO_ID} 拉取 {remote_path}...")
+        downloaded_path = self._download(remote_path, meta.commit_hash or "main")
+        opener = gzip.open if remote_path.endswith(".gz") else open
+        with opener(downloaded_path, "rb") as f:
+            remote_notes = parse_notes(f.read())
+        merged, stats = note_store.merge_remote(remote_notes, state.get("base"))
+        self._record(REMOTE_NOTES_PATH, {"commit": meta.commit_hash, "etag": meta.etag, "path": remote_path},
+                     remote_notes)
+        return meta.commit_hash, f"✅ 云端拉取合并完成（{format_merge_stats(stats)}）"
+
+    def _resolve_remote(self):
+        """按 NOTES_CODEC 决定优先探测压缩或原始文件，另一种作为回退，返回 (路径, 元数据)。"""
+        candidates = [REMOTE_NOTES_PATH, REMOTE_NOTES_GZ_PATH]
+        if NOTES_CODEC == "gzip":
+            candidates.reverse()
+        for i, path in enumerate(candidates):
+            try:
+                return path, self._head(path)
+            except EntryNotFoundError:
+                if i == len(candidates) - 1:
+                    raise
+
+    def _fetch_shard(self, note_id, revision, oid):
+        data = Path(self._download(f"{REMOTE_SHARD_DIR}/{note_id}.json", revision)).read_bytes()
+        if git_oid(data) != oid:
+            raise ValueError(f"分片校验失败: {note_id}")
+        write_bytes_atomic(shard_path(note_id), data)
+
+    def _pull_sharded(self):
+        """
+        分片布局拉取：一次 HEAD 比对索引的 etag，未变化即返回；否则读取索引中的 id -> oid，
+        只下载 oid 与本地镜像不同的分片，再把镜像中的云端笔记合并进本地。
+        """
+        meta = self._head(REMOTE_SHARD_INDEX)
+        state = read_shard_state()
+        if state.get("etag") == meta.etag:
+            return meta.commit_hash, "✅ 云端无变化，已是最新"
+
+        revision = meta.commit_hash or "main"
+        remote = json.loads(Path(self._download(REMOTE_SHARD_INDEX, revision)).read_bytes())["shards"]
+        # 索引来自云端，id 在拼成本地路径之前先校验，避免 "../x" 之类写到镜像目录之外
+        invalid = [i for i in remote if not NOTE_ID_RE.fullmatch(i)]
+        if invalid:
+            print(f"⚠️ 忽略 {len(invalid)} 个 id 不合法的分片: {invalid[:5]}")
+            remote = {i: oid for i, oid in remote.items() if NOTE_ID_RE.fullmatch(i)}
+        known = {i: oid for i, oid in state.get("shards", {}).items() if NOTE_ID_RE.fullmatch(i)}
+        SHARD_DIR.mkdir(parents=True, exist_ok=True)
+        changed = [i for i, oid in remote.items()
+                   if known.get(i) != oid or not shard_path(i).exists()]
+        print(f"🔄 正在从 Dataset {DATASET_REPO_ID} 拉取 {len(changed)}/{len(remote)} 个分片...")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=SHARD_WORKERS) as executor:
+            for future in [executor.submit(self._fetch_shard, i, revision, remote[i]) for i in changed]:
+                future.result()
+        for note_id in set(known) - set(remote):
+            shard_path(note_id).unlink(missing_ok=True)
+
+        remote_notes = [normalize_note(json.loads(shard_path(i).read_bytes())) for i in remote]
+        merged, stats = note_store.merge_remote(remote_notes, read_sync_state().get("base"))
+        write_shard_state({"commit": meta.commit_hash, "etag": meta.etag, "shards": remote})
+        self._record(REMOTE_SHARD_INDEX, {"commit": meta.commit_hash, "etag": meta.etag}, remote_notes)
+        return meta.commit_hash, f"✅ 云端拉取合并完成（{format_merge_stats(stats)}）"
+
+    def _push_sharded(self, commit_message, parent_commit):
+        """
+        分片布局推送：只把 oid 变化的笔记和新的索引放进同一个 commit，删除的笔记同时删除分片。
+        云端还是单文件布局时，这一次推送完成迁移（写入全部分片并删除 db/notes.json）。
+        """
+        state = read_shard_state()
+        known = state.get("shards")
+        migrate = []
+        if known is None:
+            known = {}
+            migrate = [p for p in (REMOTE_NOTES_PATH, REMOTE_NOTES_GZ_PATH)
+                       if self.api.file_exists(DATASET_REPO_ID, p, repo_type="dataset")]
+
+        notes = note_store.snapshot()
+        invalid = [n["id"] for n in notes if not NOTE_ID_RE.fullmatch(n["id"])]
+        if invalid:
+            # 分片以 id 命名，这类笔记无法安全地写成分片，只保留在本地
+            print(f"⚠️ {len(invalid)} 条笔记的 id 不合法，未上传: {invalid[:5]}")
+            notes = [n for n in notes if NOTE_ID_RE.fullmatch(n["id"])]
+        shards, payloads = {}, {}
+        for note in notes:
+            data = shard_bytes(note)
+            shards[note["id"]] = git_oid(data)
+            if known.get(note["id"]) != shards[note["id"]]:
+                payloads[note["id"]] = data
+        removed = set(known) - set(shards)
+        if not payloads and not removed and not migrate:
+            return True, "✅ 云端已是最新，无需备份"
+
+        operations = [CommitOperationAdd(path_in_repo=f"{REMOTE_SHARD_DIR}/{i}.json", path_or_fileobj=data)
+                      for i, data in payloads.items()]
+        operations += [CommitOperationDelete(path_in_repo=f"{REMOTE_SHARD_DIR}/{i}.json") for i in removed]
+        operations += [CommitOperationDelete(path_in_repo=p) for p in migrate]
+        index = index_bytes(shards)
+        operations.append(CommitOperationAdd(path_in_repo=REMOTE_SHARD_INDEX, path_or_fileobj=index))
+        info = self.api.create_commit(
+            repo_id=DATASET_REPO_ID,
+            repo_type="dataset",
+            operations=operations,
+            commit_message=commit_message,
+            parent_commit=parent_commit,
+        )
+
+        # 本地镜像与状态同步到刚提交的版本，下次拉取只需一次 HEAD
+        SHARD_DIR.mkdir(parents=True, exist_ok=True)
+        for note_id, data in payloads.items():
+            write_bytes_atomic(shard_path(note_id), data)
+        for note_id in removed:
+            if NOTE_ID_RE.fullmatch(note_id):
+                shard_path(note_id).unlink(missing_ok=True)
+        commit = getattr(info, "oid", None)
+        write_shard_state({"commit": commit, "etag": git_oid(index), "shards": shards})
+        self._record(REMOTE_SHARD_INDEX, {"commit": commit, "etag": git_oid(index)}, notes)
+        if migrate:
+            return True, f"✅ 已迁移为分片布局并备份 ({len(shards)} 条)"
+        return True, f"✅ 已备份至云端 (变更 {len(payloads) + len(removed)} 条)"
+
     def push(self):
+        with self._lock:
+            ok, msg = self._push()
+            if ok:
+                try:
+                    uploaded = self._push_attachments()
+                    if uploaded:
+                        msg += f"（附件 {uploaded} 个）"
+                except Exception as e:
+                    ok, msg = False, f"{msg}，但附件上传失败: {e}"
+            return ok, msg
+
+    def _push_attachments(self):
+        for attempt in range(self.PUSH_ATTEMPTS):
+            try:
+                head = self.api.repo_info(DATASET_REPO_ID, repo_type="dataset").sha
+                return attachment_store.push(self.api, head)
+            except Exception as e:
+                if "412" in str(e) and attempt < self.PUSH_ATTEMPTS - 1:
+                    continue
+                raise
+
+    def _push(self):
         ensure_local_notes()
         if not os.path.exists(LOCAL_NOTES_PATH): return False, "❌ 文件丢失"
+        commit_message = f"Web Update Pro at {now_beijing().strftime('%Y-%m-%d %H:%M:%S %z')}"
+        for attempt in range(self.PUSH_ATTEMPTS):
+            try:
+                # 先合并云端的新改动，再以合并结果覆盖云端；云端未变化时这里只有一次 HEAD
+                try:
+                    parent_commit, _ = self._sync_down()
+                except EntryNotFoundError:
+                    parent_commit = None
+                if NOTES_LAYOUT == "sharded":
+                    return self._push_sharded(commit_message, parent_commit)
+                # 上传前先把日志合并进快照，云端始终是 C# 客户端可读的统一 JSON
+                note_store.compact()
+                if NOTES_CODEC == "gzip":
+                    return self._push_gzip(commit_message, parent_commit)
+                # 上传与记录 base 用同一份字节，二者一定一致
+                data = Path(LOCAL_NOTES_PATH).read_bytes()
+                notes = parse_notes(data)
+                oids = [hashlib.sha256(data).hexdigest(), git_oid(data)]
+                info = self.api.upload_file(
+                    path_or_fileobj=data,
+                    path_in_repo=REMOTE_NOTES_PATH,
+                    repo_id=DATASET_REPO_ID,
+                    repo_type="dataset",
+                    commit_message=commit_message,
+                    parent_commit=parent_commit,
+                )
+                self._record(REMOTE_NOTES_PATH, {"commit": getattr(info, "oid", None), "oids": oids,
+                                                 "path": REMOTE_NOTES_PATH}, notes)
+                return True, "✅ 已备份至云端"
+            except Exception as e:
+                if "412" in str(e) and attempt < self.PUSH_ATTEMPTS - 1:
+                    print("云端在合并后又有新提交，重新拉取合并后再推送")
+                    continue
+                return False, f"❌ 备份失败: {e}"
+
+    def _push_gzip(self, commit_message, parent_commit):
+        """压缩后上传 db/notes.json.gz，并在同一个 commit 中删除旧的未压缩副本。"""
+        data = Path(LOCAL_NOTES_PATH).read_bytes()
+        notes = parse_notes(data)
+        fd, tmp = tempfile.mkstemp(dir=DATA_DIR, prefix=".notes.", suffix=".json.gz")
         try:
-            self.api.upload_file(
-                path_or_fileobj=LOCAL_NOTES_PATH,
-                path_in_repo=REMOTE_NOTES_PATH,
+            with os.fdopen(fd, "wb") as raw:
+                # mtime=0 让相同内容得到相同字节，云端可以识别为未变化
+                with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                    gz.write(data)
+            operations = [CommitOperationAdd(path_in_repo=REMOTE_NOTES_GZ_PATH, path_or_fileobj=tmp)]
+            if self.api.file_exists(DATASET_REPO_ID, REMOTE_NOTES_PATH, repo_type="dataset"):
+                operations.append(CommitOperationDelete(path_in_repo=REMOTE_NOTES_PATH))
+            info = self.api.create_commit(
                 repo_id=DATASET_REPO_ID,
                 repo_type="dataset",
-                commit_message=f"Web Update Pro at {now_beijing().strftime('%Y-%m-%d %H:%M:%S %z')}"
+                operations=operations,
+                commit_message=commit_message,
+                parent_commit=parent_commit,
             )
-            return True, "✅ 已备份至云端"
-        except Exception as e:
-            return False, f"❌ 备份失败: {e}"
+            self._record(REMOTE_NOTES_PATH, {"commit": getattr(info, "oid", None), "oids": list(local_oids(tmp)),
+                                             "path": REMOTE_NOTES_GZ_PATH}, notes)
+            return True, "✅ 已压缩备份至云端"
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
 
 sync_manager = CloudSync()
 
+# --- 附件 ---
+def merge_attachment_index(local, remote):
+    """
+    合并两份附件索引 {笔记 id(小写): {sha256: 元数据}}：同一笔记的同一附件取 updated_at 较新的一方，
+    移除的附件以 removed 标记保留，保证移除也能同步到另一端。
+    """
+    merged = {key: dict(items) for key, items in remote.items()}
+    for key, items in local.items():
+        target = merged.setdefault(key, {})
+        for sha, meta in items.items():
+            other = target.get(sha)
+            if other is None or parse_updated(meta.get("updated_at")) >= parse_updated(other.get("updated_at")):
+                target[sha] = meta
+    return merged
+
+def referenced_blobs(notes_index):
+    return {blob for items in notes_index.values() for meta in items.values()
+            for blob in (meta["sha256"], meta.get("thumb")) if blob}
+
+class AttachmentStore:
+    """
+    内容寻址的附件仓库：文件以 sha256 命名，同样的内容只存一份、只上传一次。
+    本地 attachments/ 目录是有上限的 LRU 缓存（以 mtime 作为最近访问时间）；
+    附件和缩略图都在第一次查看时才下载，打开笔记不会拉取仓库中的其它附件。
+    新增的附件在上传前列在 pending 中，不会被淘汰。
+    """
+    def __init__(self, root, index_path, cache_bytes):
+        self.root = Path(root)
+        self.index_path = Path(index_path)
+        self.cache_bytes = cache_bytes
+        self._lock = FileLock(f"{index_path}.lock")
+
+    def _read(self):
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except Exception:
+            index = {}
+        index.setdefault("notes", {})
+        index.setdefault("pending", [])
+        return index
+
+    def _write(self, index):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        write_bytes_atomic(self.index_path, json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def _make_thumb(self, blob, mime):
+        """图片生成不超过 THUMB_SIZE 的 JPEG 缩略图，同样按内容寻址存放；非图片或无法解码时返回 None。"""
+        if Image is None or not mime.startswith("image/"):
+            return None
+        try:
+            with Image.open(blob) as im:
+                im.thumbnail((THUMB_SIZE, THUMB_SIZE))
+                buf = BytesIO()
+                im.convert("RGB").save(buf, "JPEG", quality=80)
+        except Exception as e:
+            print(f"生成缩略图失败: {e}")
+            return None
+        data = buf.getvalue()
+        sha = hashlib.sha256(data).hexdigest()
+        if not (self.root / sha).exists():
+            write_bytes_atomic(self.root / sha, data)
+        return sha
+
+    def add(self, note_id, src, name=None):
+        """把本地文件作为附件加入笔记，返回附件元数据；上传在下次推送时进行。"""
+        name = name or Path(src).name
+        sha = file_sha256(src)
+        mime = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        with self._lock:
+            self.root.mkdir(parents=True, exist_ok=True)
+            blob = self.root / sha
+            if blob.exists():
+                os.utime(blob)
+            else:
+                install_file_atomic(src, blob)
+            meta = {
+                "sha256": sha,
+                "name": name,
+                "size": blob.stat().st_size,
+                "mime": mime,
+                "thumb": self._make_thumb(blob, mime),
+                "updated_at": now_beijing().isoformat(timespec="seconds"),
+            }
+            index = self._read()
+            index["notes"].setdefault(note_id.lower(), {})[sha] = meta
+            index["pending"] = sorted(set(index["pending"]) | {b for b in (sha, meta["thumb"]) if b})
+            index["dirty"] = True
+            self._write(index)
+        self._evict()
+        return meta
+
+    def remove(self, note_id, sha):
+        with self._lock:
+            index = self._read()
+            meta = index["notes"].get(note_id.lower(), {}).get(sha)
+            if not meta or meta.get("removed"):
+                return False
+            meta.update(removed=True, updated_at=now_beijing().isoformat(timespec="seconds"))
+            index["dirty"] = True
+            self._write(index)
+            return True
+
+    def list(self, note_id):
+        """笔记的附件元数据，按加入时间排序。"""
+        with self._lock:
+            items = self._read()["notes"].get((note_id or "").lower(), {})
+        return sorted((m for m in items.values() if not m.get("removed")), key=lambda m: m["updated_at"])
+
+    def path(self, sha):
+        """附件的本地路径；缓存中没有时才从云端下载并校验内容。"""
+        blob = self.root / sha
+        if blob.exists():
+            os.utime(blob)
+            return str(blob)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=str(self.root), prefix=".fetch.") as tmp:
+            # 下载到临时目录再移入缓存，不在 HF 全局缓存里再留一份
+            downloaded = hf_hub_download(
+                repo_id=DATASET_REPO_ID,
+                filename=f"{REMOTE_ATTACHMENT_DIR}/{sha}",
+                repo_type="dataset",
+                token=HF_TOKEN,
+                local_dir=tmp,
+            )
+            if file_sha256(downloaded) != sha:
+                raise ValueError(f"附件内容校验失败: {sha}")
+            install_file_atomic(downloaded, blob)
+        self._evict()
+        return str(blob)
+
+    def _evict(self):
+        with self._lock:
+            keep = set(self._read()["pending"])
+        try:
+            entries = [(e.stat().st_mtime, e.stat().st_size, e.path, e.name) for e in os.scandir(self.root)
+                       if e.is_file() and not e.name.startswith(".")]
+        except FileNotFoundError:
+            return
+        total = sum(size for _, size, _, _ in entries)
+        for _, size, path, name in sorted(entries):
+            if total <= self.cache_bytes:
+                break
+            if name in keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+    def _fetch_index(self, revision):
+        try:
+            path = hf_hub_download(
+                repo_id=DATASET_REPO_ID,
+                filename=REMOTE_ATTACHMENT_INDEX,
+                repo_type="dataset",
+                token=HF_TOKEN,
+                revision=revision,
+            )
+        except EntryNotFoundError:
+            return {}
+        return json.loads(Path(path).read_text(encoding="utf-8")).get("notes", {})
+
+    def sync_down(self, commit):
+        """云端有新提交时合并云端附件索引（只有元数据，不下载附件）。commit 与上次相同时不发请求。"""
+        with self._lock:
+            if commit and self._read().get("commit") == commit:
+                return
+        remote = self._fetch_index(commit or "main")
+        with self._lock:
+            index = self._read()
+            merged = merge_attachment_index(index["notes"], remote)
+            index["dirty"] = index.get("dirty", False) or merged != remote
+            index["notes"] = merged
+            index["commit"] = commit
+            self._write(index)
+
+    def push(self, api, parent_commit):
+        """
+        把待上传的附件和合并后的索引放在同一个 commit 里上传；云端已有的内容 (其他设备传过的同一文件) 不重复上传。
+        没有改动时返回 None，否则返回实际上传的附件文件数。
+        """
+        with self._lock:
+            index = self._read()
+            if not index.get("dirty") and not index["pending"]:
+                return None
+        remote = self._fetch_index(parent_commit or "main")
+        merged = merge_attachment_index(index["notes"], remote)
+        on_remote = referenced_blobs(remote)
+        uploads = [sha for sha in index["pending"] if sha not in on_remote and (self.root / sha).exists()]
+        operations = [CommitOperationAdd(path_in_repo=f"{REMOTE_ATTACHMENT_DIR}/{sha}", path_or_fileobj=str(self.root / sha))
+                      for sha in uploads]
+        operations.append(CommitOperationAdd(
+            path_in_repo=REMOTE_ATTACHMENT_INDEX,
+            path_or_fileobj=json.dumps({"format": 1, "notes": merged}, ensure_ascii=False, sort_keys=True).encode("utf-8"),
+        ))
+        info = api.create_commit(
+            repo_id=DATASET_REPO_ID,
+            repo_type="dataset",
+            operations=operations,
+            commit_message=f"Attachments update at {now_beijing().strftime('%Y-%m-%d %H:%M:%S %z')}",
+            parent_commit=parent_commit,
+        )
+        with self._lock:
+            current = self._read()
+            current["notes"] = merge_attachment_index(current["notes"], merged)
+            current["pending"] = [sha for sha in current["pending"] if sha not in index["pending"]]
+            # 上传期间又有新的增删时保持 dirty，下次推送继续
+            current["dirty"] = current["notes"] != merged
+            current["commit"] = getattr(info, "oid", None)
+            self._write(current)
+        return len(uploads)
+
+attachment_store = AttachmentStore(ATTACHMENT_DIR, ATTACHMENT_INDEX_PATH, ATTACHMENT_CACHE_MB * 1024 * 1024)
+
+# --- 后台同步队列 ---
+# 推送队列与拉取缓存共用的状态序号，轮询时取序号最大（最新）的那条状态显示
+STATUS_SEQ = itertools.count(1)
+
+class SyncQueue:
+    """
+    在后台线程里执行推送，界面事件写完本地即返回。
+    请求会合并：任意多次点击最多对应一次正在进行的推送加一次待执行的推送，
+    待执行的那次推送开始时读取的是最新的本地数据，因此不会漏掉中间的修改。
+    """
+    def __init__(self, sync):
+        self.sync = sync
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._worker = None
+        self._pending = False
+        self._running = False
+        # 状态每变化一次取一个新序号，轮询时据此判断是否需要刷新界面
+        self.version = 0
+        self._message = ""
+
+    def request(self):
+        """登记一次推送；已有待执行的推送时直接并入。"""
+        with self._lock:
+            if self._pending:
+                return self._describe()
+            self._pending = True
+            self._idle.clear()
+            self.version = next(STATUS_SEQ)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="note-sync", daemon=True)
+                self._worker.start()
+            return self._describe()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._worker = None
+                    self._idle.set()
+                    return
+                self._pending = False
+                self._running = True
+                self.version = next(STATUS_SEQ)
+            try:
+                # 失败不在这里重试：消息会显示在状态栏，下一次保存会再次排队推送
+                _, msg = self.sync.push()
+            except Exception as e:
+                msg = f"❌ 备份失败: {e}"
+            with self._lock:
+                self._running = False
+                self._message = f"{msg} ({now_beijing().strftime('%H:%M:%S')})"
+                self.version = next(STATUS_SEQ)
+            print(f"后台同步: {msg}")
+
+    def _describe(self):
+        if self._running and self._pending:
+            return "☁️ 正在后台同步，另有 1 次更新排队中"
+        if self._running or self._pending:
+            return "☁️ 正在后台同步..."
+        return self._message or "就绪"
+
+    def status(self):
+        with self._lock:
+            return self.version, self._describe()
+
+    def flush(self, timeout=SYNC_FLUSH_TIMEOUT):
+        """等待排队中的推送完成，进程退出前调用，避免最后的修改没有备份。"""
+        return self._idle.wait(timeout)
+
+sync_queue = SyncQueue(sync_manager)
+atexit.register(sync_queue.flush)
+
+class PullCache:
+    """
+    进程级的拉取缓存，供页面加载使用：
+    - 距上次成功拉取不超过 ttl 秒时直接用本地数据，不访问云端；
+    - 过期后在后台刷新 (stale-while-revalidate)，页面立即用本地数据渲染，刷新结果经状态轮询送达；
+    - 同一时刻最多一次拉取 (single-flight)，多个标签页同时打开只会触发一次。
+    """
+    def __init__(self, sync, ttl=PULL_TTL):
+        self.sync = sync
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._inflight = None     # 进行中拉取的完成事件
+        self._fetched_at = None   # 上次成功拉取的 time.monotonic()
+        self._result = (True, "就绪")
+        self.version = 0
+
+    def _fresh(self):
+        return self._fetched_at is not None and time.monotonic() - self._fetched_at < self.ttl
+
+    def _start(self):
+        done = self._inflight = threading.Event()
+        self.version = next(STATUS_SEQ)
+        threading.Thread(target=self._run, args=(done,), name="note-pull", daemon=True).start()
+        return done
+
+    def _run(self, done):
+        try:
+            result = self.sync.pull()
+        except Exception as e:
+            result = (False, f"❌ 拉取失败: {e}")
+        with self._lock:
+            if result[0]:
+                self._fetched_at = time.monotonic()
+            self._result = result
+            self._inflight = None
+            self.version = next(STATUS_SEQ)
+        done.set()
+
+    def refresh(self):
+        """页面加载时调用：数据过期则在后台开始刷新，立即返回当前状态。"""
+        with self._lock:
+            if self._inflight is None and not self._fresh():
+                self._start()
+            return self._describe()
+
+    def pull(self):
+        """手动同步：总是拉取并等待结果；已有拉取在进行时等待它而不另起一次。"""
+        with self._lock:
+            done = self._inflight or self._start()
+        done.wait()
+        with self._lock:
+            return self._result
+
+    def _describe(self):
+        if self._inflight is not None:
+            return "🔄 正在后台检查云端更新..."
+        return self._result[1]
+
+    def status(self):
+        with self._lock:
+            return self.version, self._describe()
+
+pull_cache = PullCache(sync_manager)
+
 # --- 业务逻辑 ---
-def load_notes_list(filter_type="all", search_query=""):
-    notes = read_notes()
-    query = search_query.lower() if search_query else ""
-    
-    filtered = []
-    for n in notes:
-        # Tab 过滤
-        is_deleted = n.get("is_deleted", False)
-        is_pinned = n.get("is_pinned", False)
-        
-        if filter_type == "trash":
-            if not is_deleted: continue
-        else:
-            if is_deleted: continue
-            if filter_type == "pinned" and not is_pinned: continue
-            
-        # 搜索过滤
-        if query and query not in n["title"].lower() and query not in n["content"].lower():
-            continue
-        
-        filtered.append(n)
-        
-    # 排序：置顶优先，时间倒序
-    sorted_notes = sorted(filtered, key=lambda x: (x.get("is_pinned", False), x.get("updated_at", "")), reverse=True)
-    
-    return [
-        [n["id"], f"{'📌 ' if n.get('is_pinned') else ''}{n['title'] or '未命名'}", n["updated_at"]]
-        for n in sorted_notes
-    ]
+def list_outputs(filter_type="all", search_query="", page=0):
+    """当前页的列表行、行号对应的 id、实际页码与分页提示，只有这一页会发送到浏览器。"""
+    rows, ids, page, total = note_store.list_page(filter_type, search_query, page)
+    pages = max(1, -(-total // PAGE_SIZE))
+    return rows, ids, page, f"第 {page + 1} / {pages} 页 · 共 {total} 条"
 
 def get_note_detail(note_id):
     if not note_id: return "", "", ""
-    notes = read_notes()
-    for n in notes:
-        if n["id"] == note_id:
-            return n["title"], n["content"], n["updated_at"]
+    n = note_store.get(note_id)
+    if n:
+        return n["title"], n["content"], n["updated_at"]
     return "", "", ""
 
-def handle_save(note_id, title, content, push_cloud=False):
+def get_note_version(note_id):
+    n = note_store.get(note_id) if note_id else None
+    return note_version(n) if n else ""
+
+def handle_save(note_id, title, content, push_cloud=False, filter_type="all", search_query="", page=0, version=""):
+    """
+    保存编辑器内容。version 为打开笔记时的 note_version，
+    若期间笔记已在其他窗口/进程被修改，本次编辑另存为冲突副本，两边的内容都不会丢。
+    :return: (状态, *列表输出, 笔记 id, 保存后的 version)
+    """
     if not title and not content:
-        return "无内容可保存", load_notes_list(), note_id
+        return "无内容可保存", *list_outputs(filter_type, search_query, page), note_id, version
 
-    notes = read_notes()
     now = now_beijing().isoformat(timespec="seconds")
 
-    found = False
-    for n in notes:
-        if n["id"] == note_id:
-            n["title"], n["content"], n["updated_at"] = title, content, now
-            found = True
-            break
+    status = ""
+    try:
+        found = note_id and note_store.update(note_id, expected_version=version, title=title, content=content,
+                                              updated_at=now)
+    except VersionConflict:
+        found = None
+        title = f"{title or '新笔记'} (冲突副本)"
+        status = "⚠️ 笔记已在其他窗口修改，本次编辑已另存为冲突副本 | "
 
     if not found:
         new_id = uuid4().hex
-        new_note = {
+        found = {
             "id": new_id,
             "title": title or "新笔记",
             "content": content,
@@ -261,49 +1587,117 @@ def handle_save(note_id, title, content, push_cloud=False):
             "is_pinned": False,
             "is_deleted": False
         }
-        notes.insert(0, new_note)
+        note_store.put(found)
         note_id = new_id
 
-    write_notes(notes)
-
     if push_cloud:
-        _, msg = sync_manager.push()
-        status = f"已保存并同步 | {msg}"
+        status += f"已保存 | {sync_queue.request()}"
     else:
-        status = "已自动保存到本地"
+        status += "已自动保存到本地"
 
-    return status, load_notes_list(), note_id
+    return status, *list_outputs(filter_type, search_query, page), note_id, note_version(found)
 
-def handle_delete(note_id, current_filter):
-    if not note_id: return "未选择笔记", load_notes_list(current_filter), ""
-    notes = read_notes()
-    for n in notes:
-        if n["id"] == note_id:
-            if current_filter == "trash":
-                notes.remove(n)
-            else:
-                n["is_deleted"] = True
-                n["is_pinned"] = False
-            break
-    write_notes(notes)
-    sync_manager.push()
-    return "已移至回收站" if current_filter != "trash" else "已彻底删除", load_notes_list(current_filter), ""
-
-def handle_pin(note_id, current_filter):
-    if not note_id: return load_notes_list(current_filter)
-    notes = read_notes()
-    for n in notes:
-        if n["id"] == note_id:
-            n["is_pinned"] = not n.get("is_pinned", False)
-            break
-    write_notes(notes)
-    sync_manager.push()
-    return load_notes_list(current_filter)
+def handle_delete(note_id, current_filter, search_query="", page=0):
+    if not note_id: return "未选择笔记", *list_outputs(current_filter, search_query, page), ""
+    if current_filter == "trash":
+        note_store.remove(note_id)
+    else:
+        note_store.update(note_id, is_deleted=True, is_pinned=False,
+                          updated_at=now_beijing().isoformat(timespec="seconds"))
+    status = "已移至回收站" if current_filter != "trash" else "已彻底删除"
+    status = f"{status} | {sync_queue.request()}"
+    return status, *list_outputs(current_filter, search_query, page), ""
+
+def handle_pin(note_id, current_filter, search_query="", page=0, version=""):
+    """切换置顶；同时返回笔记的新版本，编辑器随后保存时不会被误判为并发修改。"""
+    if not note_id: return "未选择笔记", *list_outputs(current_filter, search_query, page), version
+    old = note_store.get(note_id)
+    if old:
+        # 置顶也更新 updated_at，否则其他实例合并时时间相同、保留各自本地的旧状态
+        n = note_store.update(note_id, is_pinned=not old["is_pinned"],
+                              updated_at=now_beijing().isoformat(timespec="seconds"))
+        # 笔记可能刚被其他窗口彻底删除
+        if n and note_version(old) == version:
+            version = note_version(n)
+    return sync_queue.request(), *list_outputs(current_filter, search_query, page), version
+
+def format_size(size):
+    return f"{size / 1024:.0f} KB" if size < 1024 * 1024 else f"{size / 1024 / 1024:.1f} MB"
+
+def attachment_outputs(note_id):
+    """当前笔记的缩略图画廊与附件下拉选项。只会下载这条笔记的缩略图，附件本身在打开时才下载。"""
+    metas = attachment_store.list(note_id) if note_id else []
+    gallery = []
+    for m in metas:
+        if m.get("thumb"):
+            try:
+                gallery.append((attachment_store.path(m["thumb"]), m["name"]))
+            except Exception as e:
+                print(f"缩略图下载失败: {e}")
+    choices = [(f"{m['name']} ({format_size(m['size'])})", m["sha256"]) for m in metas]
+    return gallery, gr.update(choices=choices, value=None)
+
+def handle_attach(note_id, files):
+    if not note_id:
+        return "请先保存笔记再添加附件", *attachment_outputs(""), None
+    for f in files or []:
+        attachment_store.add(note_id, f)
+    return f"已添加 {len(files or [])} 个附件 | {sync_queue.request()}", *attachment_outputs(note_id), None
+
+_open_dir = None
+
+def open_dir():
+    """本进程打开附件用的临时目录，只创建一次，退出时删除。"""
+    global _open_dir
+    if _open_dir is None:
+        _open_dir = Path(tempfile.mkdtemp(prefix="note-attachment-"))
+        atexit.register(shutil.rmtree, _open_dir, True)
+    return _open_dir
+
+def handle_open_attachment(note_id, sha):
+    meta = next((m for m in attachment_store.list(note_id) if m["sha256"] == sha), None)
+    if not meta:
+        return "未选择附件", None
+    try:
+        blob = attachment_store.path(sha)
+    except Exception as e:
+        return f"❌ 附件下载失败: {e}", None
+    # 缓存里以 sha256 命名，换回原文件名再交给浏览器；按 sha256 分目录，重复打开同一附件直接复用
+    dst = open_dir() / sha / meta["name"]
+    if not dst.exists():
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(blob, dst)
+        except OSError:
+            shutil.copyfile(blob, dst)
+    return f"已打开附件: {meta['name']}", str(dst)
+
+def handle_remove_attachment(note_id, sha):
+    if not sha or not attachment_store.remove(note_id, sha):
+        return "未选择附件", *attachment_outputs(note_id)
+    return f"已移除附件 | {sync_queue.request()}", *attachment_outputs(note_id)
+
+def poll_sync_status(seen_version, filter_type="all", search_query="", page=0):
+    """
+    后台推送/拉取的状态有变化时才更新状态栏和当前页列表（拉取或推送前的合并可能带来云端改动），
+    没有变化时不返回任何更新，避免覆盖其它操作刚显示的提示。
+    """
+    version, text = max(sync_queue.status(), pull_cache.status())
+    if version == seen_version:
+        return gr.update(), *(gr.update() for _ in range(4)), seen_version
+    return text, *list_outputs(filter_type, search_query, page), version
 
 # --- Gradio UI ---
 with gr.Blocks(theme=gr.themes.Default(), head=PWA_HEAD) as demo:
     current_filter_state = gr.State("all")
     selected_note_id = gr.State("")
+    # 当前页各行对应的笔记 id 与页码，点选时按行号直接反查，不再重新计算整个列表
+    page_ids = gr.State([])
+    current_page = gr.State(0)
+    # 本会话已显示过的后台同步状态版本
+    sync_version = gr.State(0)
+    # 编辑器中笔记打开时的版本，保存时用于发现并发修改
+    note_ver = gr.State("")
     
     with gr.Row(equal_height=True):
         # 1. 导航栏 (ClassNote 风格)
@@ -327,6 +1721,10 @@ with gr.Blocks(theme=gr.themes.Default(), head=PWA_HEAD) as demo:
                 interactive=False,
                 label=None,
             )
+            with gr.Row():
+                btn_prev = gr.Button("‹ 上一页", variant="secondary", size="sm")
+                page_info = gr.Markdown("")
+                btn_next = gr.Button("下一页 ›", variant="secondary", size="sm")
             status_text = gr.Markdown("就绪")
             
         # 3. 编辑器栏
@@ -341,26 +1739,38 @@ with gr.Blocks(theme=gr.themes.Default(), head=PWA_HEAD) as demo:
             edit_content = gr.TextArea(placeholder="暂无内容，开始输入...", show_label=False, lines=25, elem_id="note_content")
             edit_date = gr.Markdown("", elem_id="note_date")
 
+            with gr.Accordion("📎 附件", open=False):
+                attach_gallery = gr.Gallery(show_label=False, columns=4, height="auto")
+                with gr.Row():
+                    attach_pick = gr.Dropdown(choices=[], show_label=False, scale=3)
+                    btn_attach_open = gr.Button("⬇️ 打开", size="sm", scale=1)
+                    btn_attach_remove = gr.Button("✖ 移除", size="sm", scale=1)
+                attach_file = gr.File(label="附件文件", interactive=False)
+                attach_upload = gr.File(label="添加附件", file_count="multiple", type="filepath")
+
     # --- 交互事件 ---
+    list_view = [note_list, page_ids, current_page, page_info]
+    editor = [selected_note_id, edit_title, edit_content, edit_date, note_ver]
 
-    def on_note_select(evt: gr.SelectData, filt):
-        curr_list = load_notes_list(filt)
-        if not curr_list or not evt.index or evt.index[0] >= len(curr_list):
-            return "", "", "", ""
-        note_id = curr_list[evt.index[0]][0]
+    def on_note_select(evt: gr.SelectData, ids):
+        row = evt.index[0] if evt.index else None
+        if row is None or row >= len(ids):
+            return "", "", "", "", ""
+        note_id = ids[row]
         title, content, date = get_note_detail(note_id)
-        return note_id, title, content, f"最后修改: {date}"
+        return note_id, title, content, f"最后修改: {date}", get_note_version(note_id)
 
-    def handle_autosave(note_id, title, content):
-        return handle_save(note_id, title, content, push_cloud=False)
+    def handle_autosave(note_id, title, content, filt, query, page, version):
+        return handle_save(note_id, title, content, False, filt, query, page, version)
 
-    def handle_manual_save(note_id, title, content):
-        return handle_save(note_id, title, content, push_cloud=True)
+    def handle_manual_save(note_id, title, content, filt, query, page, version):
+        return handle_save(note_id, title, content, True, filt, query, page, version)
 
     def switch_filter(filter_type, search_query):
         return (
             filter_type,
-            load_notes_list(filter_type, search_query),
+            *list_outputs(filter_type, search_query),
+            "",
             "",
             "",
             "",
@@ -377,33 +1787,55 @@ with gr.Blocks(theme=gr.themes.Default(), head=PWA_HEAD) as demo:
     def switch_trash(search_query):
         return switch_filter("trash", search_query)
 
-    note_list.select(on_note_select, [current_filter_state], [selected_note_id, edit_title, edit_content, edit_date])
+    attach_view = [attach_gallery, attach_pick]
+    # 先显示笔记正文，再加载这条笔记的附件缩略图
+    note_list.select(on_note_select, [page_ids], editor).then(attachment_outputs, [selected_note_id], attach_view)
+    attach_upload.upload(handle_attach, [selected_note_id, attach_upload], [status_text, *attach_view, attach_upload])
+    btn_attach_open.click(handle_open_attachment, [selected_note_id, attach_pick], [status_text, attach_file])
+    btn_attach_remove.click(handle_remove_attachment, [selected_note_id, attach_pick], [status_text, *attach_view])
 
-    search_box.change(load_notes_list, [current_filter_state, search_box], [note_list])
+    search_box.change(list_outputs, [current_filter_state, search_box], list_view)
+    btn_prev.click(lambda f, q, p: list_outputs(f, q, p - 1), [current_filter_state, search_box, current_page], list_view)
+    btn_next.click(lambda f, q, p: list_outputs(f, q, p + 1), [current_filter_state, search_box, current_page], list_view)
 
     # 离开焦点时保存
-    edit_title.blur(handle_autosave, [selected_note_id, edit_title, edit_content], [status_text, note_list, selected_note_id])
-    edit_content.blur(handle_autosave, [selected_note_id, edit_title, edit_content], [status_text, note_list, selected_note_id])
+    save_inputs = [selected_note_id, edit_title, edit_content, current_filter_state, search_box, current_page, note_ver]
+    save_outputs = [status_text, *list_view, selected_note_id, note_ver]
+    edit_title.blur(handle_autosave, save_inputs, save_outputs)
+    edit_content.blur(handle_autosave, save_inputs, save_outputs)
     # 显式保存按钮（PWA/移动端更可靠）
-    btn_save.click(handle_manual_save, [selected_note_id, edit_title, edit_content], [status_text, note_list, selected_note_id])
+    btn_save.click(handle_manual_save, save_inputs, save_outputs)
 
-    btn_all.click(switch_all, [search_box], [current_filter_state, note_list, selected_note_id, edit_title, edit_content, edit_date, status_text])
-    btn_pinned.click(switch_pinned, [search_box], [current_filter_state, note_list, selected_note_id, edit_title, edit_content, edit_date, status_text])
-    btn_trash.click(switch_trash, [search_box], [current_filter_state, note_list, selected_note_id, edit_title, edit_content, edit_date, status_text])
+    switch_outputs = [current_filter_state, *list_view, *editor, status_text]
+    clear_attachments = lambda: attachment_outputs("")
+    btn_all.click(switch_all, [search_box], switch_outputs).then(clear_attachments, None, attach_view)
+    btn_pinned.click(switch_pinned, [search_box], switch_outputs).then(clear_attachments, None, attach_view)
+    btn_trash.click(switch_trash, [search_box], switch_outputs).then(clear_attachments, None, attach_view)
 
-    btn_new.click(lambda: ("", "新笔记", "", ""), None, [selected_note_id, edit_title, edit_content, edit_date])
-    btn_pin.click(handle_pin, [selected_note_id, current_filter_state], [note_list])
-    btn_del.click(handle_delete, [selected_note_id, current_filter_state], [status_text, note_list, selected_note_id])
+    btn_new.click(lambda: ("", "新笔记", "", "", ""), None, editor).then(clear_attachments, None, attach_view)
+    list_inputs = [selected_note_id, current_filter_state, search_box, current_page]
+    btn_pin.click(handle_pin, [*list_inputs, note_ver], [status_text, *list_view, note_ver])
+    btn_del.click(handle_delete, list_inputs, [status_text, *list_view, selected_note_id])
 
-    btn_sync_pull.click(lambda: (sync_manager.pull()[1], load_notes_list()), None, [status_text, note_list])
+    btn_sync_pull.click(lambda f, q: (pull_cache.pull()[1], *list_outputs(f, q)), [current_filter_state, search_box],
+                        [status_text, *list_view])
 
     def ai_polish(content):
         if not content: return content
         return f"✨ [AI 润色已模拟完成]\n\n{content}\n\n(请在本地动作中使用完整的 DeepSeek 润色服务)"
     btn_ai.click(ai_polish, [edit_content], [edit_content])
 
-    # 启动拉取
-    demo.load(lambda: (sync_manager.pull()[1], load_notes_list()), None, [status_text, note_list])
+    # 启动时先用本地数据渲染，云端数据过期时在后台刷新，结果由下面的轮询带回
+    demo.load(lambda: (pull_cache.refresh(), *list_outputs()), None, [status_text, *list_view])
+
+    # 轮询后台同步状态 (gr.Timer 需要 Gradio 4.40+，更早的版本用 every= 定时执行)
+    poll_inputs = [sync_version, current_filter_state, search_box, current_page]
+    poll_outputs = [status_text, *list_view, sync_version]
+    if hasattr(gr, "Timer"):
+        gr.Timer(SYNC_POLL_INTERVAL).tick(poll_sync_status, poll_inputs, poll_outputs)
+    else:
+        demo.load(poll_sync_status, poll_inputs, poll_outputs, every=SYNC_POLL_INTERVAL)
 
 if __name__ == "__main__":
-    demo.launch()
+    # 缩略图直接从附件缓存 (DATA_DIR 下) 提供，不在 Gradio 默认允许的目录里，需要显式放行
+    demo.queue(default_concurrency_limit=NOTES_CONCURRENCY).launch(allowed_paths=[str(ATTACHMENT_DIR)])
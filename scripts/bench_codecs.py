@@ -0,0 +1,100 @@
+import os
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from pathlib import Path
+
+from persistence_manager import CODECS, compress_file, decompress_file
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+NOTE_APP = REPO_ROOT / "example" / "hf-note-app"
+DEFAULT_FILES = [
+    NOTE_APP / "data" / "notes.json",
+    NOTE_APP / "archive" / "legacy-db" / "data" / "notes.db",
+]
+SAMPLE_PHRASES = [
+    "今天的会议纪要：", "本地优先，后台异步备份到私有 Dataset。", "待办：整理 Space 的环境变量。",
+    "HuggingFace 笔记同步测试", "Local-first notes synced to a private dataset.", "TODO: restart the Space after deploy.",
+    "参考链接 https://huggingface.co/docs", "数据库备份", "读书笔记", "灵感", "- [ ] ", "\n",
+]
+
+
+def make_synthetic(workdir, count):
+    """生成与笔记应用同格式的 notes.json 和 SQLite 数据库，便于在真实规模下测量。"""
+    rnd = random.Random(42)
+    notes = []
+    for i in range(count):
+        body = "".join(rnd.choice(SAMPLE_PHRASES) for _ in range(rnd.randint(5, 60)))
+        notes.append({
+            "id": f"{rnd.getrandbits(128):032x}",
+            "title": f"笔记 {i}",
+            "content": body,
+            "updated_at": f"2026-02-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00+08:00",
+            "is_pinned": i % 17 == 0,
+            "is_deleted": i % 31 == 0,
+        })
+    json_path = Path(workdir) / f"notes-{count}.json"
+    json_path.write_text(json.dumps(notes, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    db_path = Path(workdir) / f"notes-{count}.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE notes (id TEXT PRIMARY KEY, title TEXT, content TEXT, updated_at TEXT)")
+    conn.executemany(
+        "INSERT INTO notes VALUES (?, ?, ?, ?)",
+        [(n["id"], n["title"], n["content"], n["updated_at"]) for n in notes],
+    )
+    conn.commit()
+    conn.close()
+    return [json_path, db_path]
+
+
+def bench_file(path, codecs, workdir):
+    size = os.path.getsize(path)
+    rows = []
+    for codec in codecs:
+        packed = Path(workdir) / f"packed{CODECS[codec][0]}"
+        restored = Path(workdir) / "restored"
+        try:
+            t0 = time.perf_counter()
+            compress_file(path, packed, codec)
+            t1 = time.perf_counter()
+            decompress_file(packed, restored, codec)
+            t2 = time.perf_counter()
+        except RuntimeError as e:
+            print(f"  {codec:<6} 跳过: {e}")
+            continue
+        packed_size = os.path.getsize(packed)
+        mb = size / 1024 / 1024
+        rows.append((codec, packed_size, size / max(packed_size, 1), mb / max(t1 - t0, 1e-9), mb / max(t2 - t1, 1e-9)))
+    return size, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="压缩编解码器基准：压缩率 vs. 吞吐量")
+    parser.add_argument("files", nargs="*", help="待测文件 (默认: 示例笔记 JSON 与 legacy SQLite)")
+    parser.add_argument("--synthetic", type=int, default=20000, help="额外生成 N 条笔记的 JSON/SQLite 样本 (0 关闭)")
+    parser.add_argument("--codecs", default=",".join(CODECS), help="逗号分隔的编解码器列表")
+    args = parser.parse_args()
+
+    codecs = [c for c in args.codecs.split(",") if c]
+    with tempfile.TemporaryDirectory() as workdir:
+        files = [Path(f) for f in args.files] or [p for p in DEFAULT_FILES if p.exists()]
+        if args.synthetic:
+            files += make_synthetic(workdir, args.synthetic)
+
+        print(f"{'文件':<28} | {'编解码器':<6} | {'原始大小':>10} | {'压缩后':>10} | {'压缩率':>6} | {'压缩 MB/s':>9} | {'解压 MB/s':>9}")
+        print("-" * 100)
+        for path in files:
+            size, rows = bench_file(path, codecs, workdir)
+            for codec, packed_size, ratio, c_speed, d_speed in rows:
+                print(f"{path.name:<28} | {codec:<6} | {size:>10} | {packed_size:>10} | {ratio:>5.1f}x | {c_speed:>9.1f} | {d_speed:>9.1f}")
+        print("-" * 100)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
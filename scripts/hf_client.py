@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import tempfile
+import functools
+import contextlib
+from pathlib import Path
+from email.utils import parsedate_to_datetime
+from huggingface_hub import HfApi, get_session
+
+# whoami 结果的本地缓存：按 token 的 sha256 索引 (不保存 token 本身)，过期后重新查询
+IDENTITY_TTL = int(os.environ.get("HF_IDENTITY_TTL", str(7 * 24 * 3600)))
+CACHE_DIR = Path(os.environ.get("HF_CLIENT_CACHE_DIR") or Path.home() / ".cache" / "hf-client")
+IDENTITY_CACHE_PATH = CACHE_DIR / "identity.json"
+# 429/5xx 与网络错误的重试：指数退避 + 随机抖动，服务端给出 Retry-After 时以它为准
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+
+# huggingface_hub 0.x 的会话基于 requests，1.x 基于 httpx，2.x 基于 httpx2，三者的网络异常都归入这里
+HTTP_ERRORS = ()
+try:
+    import requests
+    HTTP_ERRORS += (requests.exceptions.RequestException,)
+except ImportError:
+    pass
+for _name in ("httpx", "httpx2"):
+    try:
+        HTTP_ERRORS += (__import__(_name).HTTPError,)
+    except ImportError:
+        pass
+
+
+def get_token():
+    hf_token = os.environ.get("HF_TOKEN")
+    if not hf_token:
+        print("错误: 未找到系统环境变量 'HF_TOKEN'。")
+        print("请在系统环境变量或终端中设置 HF_TOKEN。")
+        sys.exit(1)
+    return hf_token
+
+
+@functools.lru_cache(maxsize=None)
+def get_api():
+    """进程内共用的 HfApi；底层连接池由 huggingface_hub 管理，与 http_session() 是同一个。"""
+    return HfApi(token=get_token())
+
+
+def http_session():
+    """
+    huggingface_hub 自身使用的 keep-alive 会话 (requests.Session 或 httpx.Client)。
+    脚本里直接调用的 REST/SSE 接口也走它，与 HfApi 的请求复用同一批 TLS 连接。
+    """
+    return get_session()
+
+
+def auth_headers(**extra):
+    return {"Authorization": f"Bearer {get_token()}", **extra}
+
+
+def _token_key(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _read_identity_cache():
+    try:
+        data = json.loads(IDENTITY_CACHE_PATH.read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def remember_username(token, username):
+    """把 token 对应的用户名写入本地缓存 (原子替换)。"""
+    cache = _read_identity_cache()
+    now = time.time()
+    # 顺带清理过期条目，缓存文件不会无限增长
+    cache = {k: v for k, v in cache.items() if now - v.get("ts", 0) < IDENTITY_TTL}
+    cache[_token_key(token)] = {"name": username, "ts": now}
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, prefix=".identity.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp, IDENTITY_CACHE_PATH)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def cached_username(token):
+    entry = _read_identity_cache().get(_token_key(token))
+    if entry and time.time() - entry.get("ts", 0) < IDENTITY_TTL:
+        return entry.get("name")
+    return None
+
+
+def get_username(api=None):
+    """
+    当前 token 对应的用户名。缓存有效期内不发请求，否则调用一次 whoami 并写入缓存。
+    """
+    token = get_token()
+    username = cached_username(token)
+    if username:
+        return username
+    try:
+        username = (api or get_api()).whoami().get("name")
+    except Exception as e:
+        print(f"获取账户信息失败: {e}")
+        sys.exit(1)
+    remember_username(token, username)
+    return username
+
+
+def resolve_repo_id(name, api=None):
+    """短名称补全为 <用户名>/<名称>；已带命名空间的 id 原样返回，不查询用户名。"""
+    if "/" in name:
+        return name
+    return f"{get_username(api)}/{name}"
+
+
+@contextlib.contextmanager
+def open_stream(url, headers=None, timeout=120):
+    """
+    以流式 GET 打开一个长连接 (SSE 等)，兼容 requests 与 httpx 两类会话。
+    产出 (response, lines)：lines 逐行产出 str；状态码非 200 时响应体已读入，可直接用 .text / .json()。
+    """
+    session = http_session()
+    if hasattr(session, "stream"):
+        with session.stream("GET", url, headers=headers, timeout=timeout) as r:
+            if r.status_code != 200:
+                r.read()
+            yield r, r.iter_lines()
+    else:
+        with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+            yield r, (line.decode("utf-8") for line in r.iter_lines())
+
+
+def retry_after_seconds(response):
+    """解析 Retry-After 头 (秒数或 HTTP 日期)，没有或无法解析时返回 None。"""
+    value = (getattr(response, "headers", None) or {}).get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(error, attempt):
+    """
+    第 attempt 次 (从 0 开始) 失败后应等待的秒数；不值得重试的错误 (4xx 等) 返回 None。
+    可重试：429、5xx 以及连接/超时等网络错误。
+    """
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        if status != 429 and not 500 <= status < 600:
+            return None
+    elif not isinstance(error, HTTP_ERRORS):
+        return None
+    retry_after = retry_after_seconds(response)
+    if retry_after is not None:
+        # 加一点抖动，避免并发请求在同一时刻一起重试
+        return min(retry_after, RETRY_MAX_DELAY) + random.uniform(0, RETRY_BASE_DELAY)
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
@@ -0,0 +1,165 @@
+import os
+import time
+import sqlite3
+from datetime import datetime
+from hf_client import CACHE_DIR
+
+# 本地仓库目录：list 命令直接从这里读取，离线也能用；超过 max-age 才与 Hub 同步
+CATALOG_PATH = CACHE_DIR / "catalog.sqlite"
+CATALOG_MAX_AGE = int(os.environ.get("HF_CATALOG_MAX_AGE", "600"))  # 秒
+# 增量同步看不到已删除的仓库，每隔这么久做一次完整同步清理
+FULL_SYNC_INTERVAL = 24 * 3600
+SORT_COLUMNS = {
+    "name": "id COLLATE NOCASE",
+    "modified": "last_modified DESC",
+    "stage": "stage, id COLLATE NOCASE",
+}
+
+
+def _to_iso(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value) if value else None
+
+
+def _list_repos(api, repo_type, author):
+    """
+    按 lastModified 倒序列出仓库。huggingface_hub 1.x 起去掉了 direction 参数 (排序固定为倒序)；
+    都不支持时退回默认顺序，并由调用方改做完整同步。
+    :return: (仓库迭代器, 是否按 lastModified 倒序)
+    """
+    list_fn = api.list_spaces if repo_type == "space" else api.list_datasets
+    for kwargs in ({"sort": "lastModified", "direction": -1}, {"sort": "lastModified"}):
+        try:
+            return list_fn(author=author, **kwargs), True
+        except TypeError:
+            continue
+    return list_fn(author=author), False
+
+
+class HubCatalog:
+    """
+    Spaces / Datasets 元数据的 SQLite 缓存 (CACHE_DIR/catalog.sqlite)：
+    repos 表保存 id、私有标记、lastModified、sdk，以及最近一次查询到的运行时状态与硬件；
+    meta 表记录每个 (类型, 作者) 上次增量/完整同步的时间。
+    """
+    def __init__(self, path=CATALOG_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS repos (
+                repo_type TEXT NOT NULL,
+                id TEXT NOT NULL,
+                author TEXT NOT NULL,
+                private INTEGER,
+                last_modified TEXT,
+                sdk TEXT,
+                hardware TEXT,
+                stage TEXT,
+                host TEXT,
+                runtime_at REAL,
+                PRIMARY KEY (repo_type, id)
+            );
+            CREATE INDEX IF NOT EXISTS repos_author ON repos (repo_type, author);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL);
+            """
+        )
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def age(self, repo_type, author):
+        """距上次同步的秒数，从未同步过时返回 None。"""
+        synced = self._meta(f"synced:{repo_type}:{author}")
+        return None if synced is None else time.time() - synced
+
+    def sync(self, api, repo_type, author, full=False):
+        """
+        与 Hub 同步 author 名下的仓库元数据。
+        增量模式按 lastModified 倒序翻页，遇到与本地记录完全一致的仓库即停止 (更早的都没有变化)；
+        完整模式 (首次、显式要求或距上次完整同步超过 FULL_SYNC_INTERVAL) 走完全部列表并删除已不存在的仓库。
+        :return: 新增或 lastModified 变化的仓库信息对象列表 (调用方据此只刷新这些 Space 的运行时)
+        """
+        known = {row["id"]: row["last_modified"] for row in self.conn.execute(
+            "SELECT id, last_modified FROM repos WHERE repo_type = ? AND author = ?", (repo_type, author))}
+        last_full = self._meta(f"full:{repo_type}:{author}")
+        listing, ordered = _list_repos(api, repo_type, author)
+        full = full or not known or not ordered or last_full is None or time.time() - last_full > FULL_SYNC_INTERVAL
+
+        changed, seen = [], set()
+        for info in listing:
+            repo_id = info.id
+            last_modified = _to_iso(getattr(info, "last_modified", None) or getattr(info, "lastModified", None))
+            seen.add(repo_id)
+            if repo_id in known and known[repo_id] == last_modified and last_modified:
+                if not full:
+                    break
+                continue
+            self.conn.execute(
+                """
+                INSERT INTO repos (repo_type, id, author, private, last_modified, sdk) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (repo_type, id) DO UPDATE SET
+                    private = excluded.private, last_modified = excluded.last_modified, sdk = excluded.sdk
+                """,
+                (repo_type, repo_id, author, int(bool(getattr(info, "private", False))), last_modified,
+                 getattr(info, "sdk", None)),
+            )
+            changed.append(info)
+
+        now = time.time()
+        if full:
+            gone = [repo_id for repo_id in known if repo_id not in seen]
+            self.conn.executemany("DELETE FROM repos WHERE repo_type = ? AND id = ?",
+                                  [(repo_type, repo_id) for repo_id in gone])
+            self._set_meta(f"full:{repo_type}:{author}", now)
+        self._set_meta(f"synced:{repo_type}:{author}", now)
+        self.conn.commit()
+        return changed
+
+    def update_runtime(self, repo_id, runtime):
+        """记录一个 Space 最新查询到的运行时 (状态、硬件、域名)。"""
+        hardware = getattr(runtime, "hardware", None)
+        self.conn.execute(
+            "UPDATE repos SET stage = ?, hardware = ?, host = ?, runtime_at = ? WHERE repo_type = 'space' AND id = ?",
+            (runtime.stage, getattr(hardware, "value", hardware), getattr(runtime, "host", None), time.time(), repo_id),
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def query(self, repo_type, author, stage=None, sdk=None, private=None, sort="name"):
+        """按条件从本地目录读取仓库，不访问网络。"""
+        sql = "SELECT * FROM repos WHERE repo_type = ? AND author = ?"
+        params = [repo_type, author]
+        if stage:
+            sql += " AND stage = ? COLLATE NOCASE"
+            params.append(stage)
+        if sdk:
+            sql += " AND sdk = ? COLLATE NOCASE"
+            params.append(sdk)
+        if private is not None:
+            sql += " AND private = ?"
+            params.append(int(private))
+        sql += f" ORDER BY {SORT_COLUMNS[sort]}"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def close(self):
+        self.conn.close()
+
+
+def format_age(seconds):
+    if seconds is None:
+        return "从未同步"
+    if seconds < 60:
+        return f"{seconds:.0f} 秒前"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} 分钟前"
+    if seconds < 86400:
+        return f"{seconds / 3600:.1f} 小时前"
+    return f"{seconds / 86400:.1f} 天前"
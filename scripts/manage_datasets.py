@@ -1,50 +1,39 @@
-import os
-import sys
 import argparse
-from huggingface_hub import HfApi
+from hf_client import get_api, get_username, resolve_repo_id
+from hub_catalog import HubCatalog, CATALOG_MAX_AGE, format_age
 
-def get_api():
-    hf_token = os.environ.get("HF_TOKEN")
-    if not hf_token:
-        print("错误: 未找到系统环境变量 'HF_TOKEN'。")
-        sys.exit(1)
-    return HfApi(token=hf_token)
-
-def get_username(api):
-    try:
-        user_info = api.whoami()
-        return user_info.get("name")
-    except Exception as e:
-        print(f"获取账户信息失败: {e}")
-        sys.exit(1)
-
-def list_datasets():
+def list_datasets(refresh=False, private=None, sort="name", max_age=CATALOG_MAX_AGE):
+    """从本地目录列出数据库；目录超过 max_age 秒或指定 refresh 时先与 Hub 增量同步。"""
     api = get_api()
     username = get_username(api)
-    print(f"正在拉取 {username} 的 Datasets (云端数据库) 列表...\n")
+    catalog = HubCatalog()
     try:
-        datasets = api.list_datasets(author=username)
+        age = catalog.age("dataset", username)
+        if refresh or age is None or age > max_age:
+            print(f"正在同步 {username} 的 Datasets (云端数据库) 列表...\n")
+            try:
+                catalog.sync(api, "dataset", username)
+                age = catalog.age("dataset", username)
+            except Exception as e:
+                if age is None:
+                    raise
+                print(f"⚠️ 同步失败，显示本地缓存的目录: {e}")
+        rows = catalog.query("dataset", username, private=private, sort=sort)
         print(f"{'Dataset 名称':<30} | {'私有':<5} | {'最后更新':<25}")
         print("-" * 75)
-        count = 0
-        for ds in datasets:
-            name = ds.id.split("/")[-1]
-            is_private = "Yes" if ds.private else "No"
-            last_modified = getattr(ds, 'lastModified', 'N/A')
-            print(f"{name:<30} | {is_private:<5} | {last_modified}")
-            count += 1
+        for row in rows:
+            is_private = "Yes" if row["private"] else "No"
+            print(f"{row['id'].split('/')[-1]:<30} | {is_private:<5} | {row['last_modified'] or 'N/A'}")
         print("-" * 75)
-        print(f"共发现 {count} 个数据库资产。\n")
+        print(f"共发现 {len(rows)} 个数据库资产 (本地目录，同步于 {format_age(age)}；--refresh 立即同步)。\n")
     except Exception as e:
         print(f"获取 Datasets 列表失败: {e}")
+    finally:
+        catalog.close()
 
 def view_dataset(dataset_id):
     api = get_api()
-    if "/" not in dataset_id:
-        username = get_username(api)
-        repo_id = f"{username}/{dataset_id}"
-    else:
-        repo_id = dataset_id
+    repo_id = resolve_repo_id(dataset_id, api)
         
     print(f"正在扫描数据库 [{repo_id}] 存档的文件内容...\n")
     try:
@@ -76,11 +65,7 @@ def create_dataset(name, is_private=True):
 
 def delete_dataset(dataset_id):
     api = get_api()
-    if "/" not in dataset_id:
-        username = get_username(api)
-        repo_id = f"{username}/{dataset_id}"
-    else:
-        repo_id = dataset_id
+    repo_id = resolve_repo_id(dataset_id, api)
         
     confirm = input(f"⚠️ 确定要永久删除数据库 [{repo_id}] 吗？内容将无法找回！(y/N): ")
     if confirm.lower() == 'y':
@@ -97,7 +82,13 @@ if __name__ == "__main__":
     subparsers = parser.add_subparsers(dest="command")
 
     # list
-    subparsers.add_parser("list", help="列出所有数据库")
+    parser_list = subparsers.add_parser("list", help="列出所有数据库")
+    parser_list.add_argument("--refresh", action="store_true", help="立即与 Hub 增量同步本地目录")
+    parser_list.add_argument("--max-age", type=int, default=CATALOG_MAX_AGE, help="本地目录超过该秒数自动同步")
+    visibility = parser_list.add_mutually_exclusive_group()
+    visibility.add_argument("--private", dest="private", action="store_const", const=True, help="只看私有")
+    visibility.add_argument("--public", dest="private", action="store_const", const=False, help="只看公开")
+    parser_list.add_argument("--sort", choices=["name", "modified"], default="name")
     
     # view
     parser_view = subparsers.add_parser("view", help="查看数据库内部文件内容")
@@ -114,7 +105,7 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
     
-    if args.command == "list": list_datasets()
+    if args.command == "list": list_datasets(args.refresh, args.private, args.sort, args.max_age)
     elif args.command == "view": view_dataset(args.id)
     elif args.command == "create": create_dataset(args.name, not args.public)
     elif args.command == "delete": delete_dataset(args.id)
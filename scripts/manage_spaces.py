@@ -1,98 +1,251 @@
-import os
 import sys
+import time
+import heapq
+import fnmatch
+import asyncio
 import argparse
+import functools
+import collections
 import concurrent.futures
-from huggingface_hub import HfApi, SpaceRuntime
+from types import SimpleNamespace
+from huggingface_hub import SpaceRuntime
+from hf_client import get_api, get_username, resolve_repo_id, open_stream, retry_delay, RETRY_ATTEMPTS
+from hub_catalog import HubCatalog, CATALOG_MAX_AGE, SORT_COLUMNS, format_age
 
-def get_api():
-    hf_token = os.environ.get("HF_TOKEN")
-    if not hf_token:
-        print("错误: 未找到系统环境变量 'HF_TOKEN'。")
-        print("请在系统环境变量或终端中设置 HF_TOKEN。")
-        sys.exit(1)
-    return HfApi(token=hf_token)
+RUNTIME_CONCURRENCY = 16
+# 批量 restart/pause 的并发数：这些接口比查询重，默认保守一些
+ACTION_CONCURRENCY = 8
+# watch 的自适应轮询间隔 (秒)：构建/启动中轮询得快，稳定状态轮询得慢
+WATCH_FAST_INTERVAL = 3
+WATCH_SLOW_INTERVAL = 30
+WATCH_ERROR_INTERVAL = 10
+STABLE_STAGES = {"RUNNING", "PAUSED", "SLEEPING", "STOPPED"}
 
-def get_username(api):
+def stage_symbol(stage):
+    return "🟢" if stage == "RUNNING" else ("🔴" if "ERROR" in stage else ("🟡" if "BUILDING" in stage else ("⏸️" if stage == "PAUSED" or stage == "STOPPED" else "⚪")))
+
+def print_header():
+    print(f"{'Space 名称':<25} | {'运行状态/Stage':<18} | {'私有':<5} | {'Space 主页 URL':<45} | {'Direct App URL'}")
+    print("-" * 155)
+
+def print_space_row(repo_id, private, runtime, error=None):
+    name = repo_id.split("/")[-1]
+    stage = runtime.stage if runtime else ("FETCH_ERROR" if error else "UNKNOWN")
+    is_private = "Yes" if private else "No"
+    space_url = f"https://huggingface.co/spaces/{repo_id}"
+
+    host = getattr(runtime, 'host', None) if runtime else None
+    direct_url = f"https://{host}" if host else f"https://{repo_id.replace('/', '-')}.hf.space"
+
+    print(f"{name:<25} | {stage_symbol(stage)} {stage:<16} | {is_private:<5} | {space_url:<45} | {direct_url}", flush=True)
+    return stage
+
+async def fetch_runtime(api, repo_id, sem, executor):
+    """
+    在线程池中调用 get_space_runtime，并发数由 sem 限制。
+    429/5xx/网络错误按 retry_delay 退避重试 (遵守 Retry-After)，最终失败时返回 (None, 异常) 而不是静默吞掉。
+    """
+    loop = asyncio.get_running_loop()
+    async with sem:
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                return await loop.run_in_executor(executor, functools.partial(api.get_space_runtime, repo_id=repo_id)), None
+            except Exception as e:
+                delay = retry_delay(e, attempt)
+                if delay is None or attempt == RETRY_ATTEMPTS - 1:
+                    return None, e
+                # 退避期间继续占用并发名额，被限流时整体请求速率随之降下来
+                await asyncio.sleep(delay)
+
+async def stream_space_runtimes(api, spaces, concurrency, on_result=print_space_row):
+    """
+    边翻页拉取 Space 列表边并发查询运行时，每查完一个立即回调 on_result(repo_id, private, runtime, error)
+    (默认打印一行)，回调返回该 Space 的状态。
+    :return: [(repo_id, stage, error)]，按完成顺序
+    """
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(concurrency)
+    results = []
+    # 多留一个线程给列表翻页，避免它排在运行时查询后面
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency + 1) as executor:
+        async def one(space):
+            # 使用 id 或 modelId (兼容 repo_info 返回的不同接口)
+            repo_id = getattr(space, 'id', getattr(space, 'modelId', ''))
+            runtime, error = await fetch_runtime(api, repo_id, sem, executor)
+            results.append((repo_id, on_result(repo_id, space.private, runtime, error), error))
+
+        tasks = []
+        pages = iter(spaces)
+        done = object()
+        while True:
+            # list_spaces 是分页生成器，翻页是阻塞请求，放进线程池执行
+            space = await loop.run_in_executor(executor, next, pages, done)
+            if space is done:
+                break
+            tasks.append(asyncio.create_task(one(space)))
+        await asyncio.gather(*tasks)
+    return results
+
+def print_summary(results):
+    """按状态汇总数量 (多的在前)，并按名称列出查询失败的 Space。"""
+    counts = collections.Counter(stage for _, stage, _ in results)
+    summary = "，".join(f"{stage_symbol(stage)} {stage} {n}" for stage, n in sorted(counts.items(), key=lambda x: (-x[1], x[0])))
+    print(f"共检索到 {len(results)} 个 Spaces：{summary}")
+    failed = sorted((repo_id, error) for repo_id, _, error in results if error)
+    if failed:
+        print(f"其中 {len(failed)} 个运行时查询失败：")
+        for repo_id, error in failed:
+            print(f" - {repo_id}: {error}")
+    print()
+
+def print_catalog(rows, age):
+    print(f"{'Space 名称':<25} | {'运行状态/Stage':<18} | {'私有':<5} | {'SDK':<9} | {'硬件':<12} | {'最后更新':<20} | {'Direct App URL'}")
+    print("-" * 145)
+    for row in rows:
+        repo_id = row["id"]
+        stage = row["stage"] or "UNKNOWN"
+        direct_url = f"https://{row['host']}" if row["host"] else f"https://{repo_id.replace('/', '-')}.hf.space"
+        print(f"{repo_id.split('/')[-1]:<25} | {stage_symbol(stage)} {stage:<16} | {'Yes' if row['private'] else 'No':<5} | "
+              f"{row['sdk'] or '-':<9} | {row['hardware'] or '-':<12} | {(row['last_modified'] or '-')[:19]:<20} | {direct_url}")
+    print("-" * 145)
+    print(f"共 {len(rows)} 个 Spaces (本地目录，同步于 {format_age(age)}；--refresh 立即同步，--live 查询全部实时状态)\n")
+
+def list_spaces_live(api, username, concurrency, catalog):
+    """实时模式：查询全部 Space 的运行时并逐行输出，结果同时写入本地目录。"""
+    print(f"正在拉取 {username} 的 Spaces 列表与实时状态 (并发 {concurrency})...\n")
+    print_header()
+
+    runtimes = {}
+
+    def on_result(repo_id, private, runtime, error):
+        if runtime:
+            runtimes[repo_id] = runtime
+        return print_space_row(repo_id, private, runtime, error)
+
+    results = asyncio.run(stream_space_runtimes(api, api.list_spaces(author=username), concurrency, on_result))
+    print("-" * 155)
+    print_summary(results)
+    # 输出完毕后再落盘：先同步目录 (通常是增量的一次翻页)，再写入刚查到的状态
     try:
-        user_info = api.whoami()
-        return user_info.get("name")
+        catalog.sync(api, "space", username)
+        for repo_id, runtime in runtimes.items():
+            catalog.update_runtime(repo_id, runtime)
+        catalog.commit()
     except Exception as e:
-        print(f"获取账户信息失败: {e}")
-        sys.exit(1)
+        print(f"⚠️ 本地目录更新失败: {e}")
 
-def fetch_runtime_and_merge(space, api):
-    try:
-        # 获取最新的运行时信息
-        return space.id, api.get_space_runtime(repo_id=space.id)
-    except:
-        return space.id, None
+def refresh_catalog(api, username, catalog, concurrency):
+    """增量同步目录，只为新增或 lastModified 变化的 Space 重新查询运行时。"""
+    changed = catalog.sync(api, "space", username)
+    if changed:
+        print(f"正在同步 {len(changed)} 个有变化的 Space...")
 
-def list_spaces(target_space_id=None):
+        def on_result(repo_id, private, runtime, error):
+            if runtime:
+                catalog.update_runtime(repo_id, runtime)
+            else:
+                print(f" ⚠️ {repo_id}: {error}")
+            return runtime.stage if runtime else "FETCH_ERROR"
+
+        asyncio.run(stream_space_runtimes(api, changed, concurrency, on_result))
+        catalog.commit()
+
+def list_spaces(target_space_id=None, concurrency=RUNTIME_CONCURRENCY, refresh=False, live=False,
+                stage=None, sdk=None, private=None, sort="name", max_age=CATALOG_MAX_AGE):
+    """
+    列出 Spaces。默认从本地 SQLite 目录读取 (离线可用、毫秒级)，目录超过 max_age 秒或指定 refresh 时先增量同步；
+    live 时查询全部实时状态并逐行输出。
+    """
     api = get_api()
-    username = get_username(api)
     
     try:
         if target_space_id:
             # 获取单个特定的 Space 状态
-            if "/" not in target_space_id:
-                repo_id = f"{username}/{target_space_id}"
-            else:
-                repo_id = target_space_id
+            repo_id = resolve_repo_id(target_space_id, api)
             
             print(f"正在获取 [{repo_id}] 的实时状态...")
             # 获取 Space 基本信息 (为了获取 name, private 等)
             space_info = api.repo_info(repo_id=repo_id, repo_type="space")
             runtime = api.get_space_runtime(repo_id=repo_id)
-            spaces = [space_info]
-            runtime_map = {repo_id: runtime}
+            print_header()
+            print_space_row(repo_id, space_info.private, runtime)
+            print("-" * 155)
         else:
-            # 获取全部列表
-            print(f"正在拉取 {username} 的 Spaces 列表与实时状态...\n")
-            spaces = list(api.list_spaces(author=username))
-            
-            # 并发获取运行时信息以提高速度
-            runtime_map = {}
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_id = {executor.submit(fetch_runtime_and_merge, space, api): space.id for space in spaces}
-                for future in concurrent.futures.as_completed(future_to_id):
-                    sid, runtime = future.result()
-                    runtime_map[sid] = runtime
-
-        print(f"{'Space 名称':<25} | {'运行状态/Stage':<18} | {'私有':<5} | {'Space 主页 URL':<45} | {'Direct App URL'}")
-        print("-" * 155)
-        
-        # 使用 id 或 modelId (兼容 repo_info 返回的不同接口)
-        sorted_spaces = sorted(spaces, key=lambda x: getattr(x, 'id', getattr(x, 'modelId', '')))
-        
-        for space in sorted_spaces:
-            repo_id = getattr(space, 'id', getattr(space, 'modelId', ''))
-            name = repo_id.split("/")[-1]
-            
-            runtime = runtime_map.get(repo_id)
-            stage = runtime.stage if runtime else "UNKNOWN"
-            is_private = "Yes" if space.private else "No"
-            
-            status_symbol = "🟢" if stage == "RUNNING" else ("🔴" if "ERROR" in stage else ("🟡" if "BUILDING" in stage else ("⏸️" if stage == "PAUSED" or stage == "STOPPED" else "⚪")))
-            space_url = f"https://huggingface.co/spaces/{repo_id}"
-            
-            host = getattr(runtime, 'host', None) if runtime else None
-            direct_url = f"https://{host}" if host else f"https://{repo_id.replace('/', '-')}.hf.space"
-            
-            print(f"{name:<25} | {status_symbol} {stage:<16} | {is_private:<5} | {space_url:<45} | {direct_url}")
-            
-        print("-" * 155)
-        if not target_space_id:
-            print(f"共检索到 {len(sorted_spaces)} 个 Spaces。\n")
+            username = get_username(api)
+            catalog = HubCatalog()
+            try:
+                if live:
+                    # 获取全部列表：结果按返回顺序逐行输出，最后给出汇总
+                    list_spaces_live(api, username, concurrency, catalog)
+                    return
+                age = catalog.age("space", username)
+                if refresh or age is None or age > max_age:
+                    try:
+                        refresh_catalog(api, username, catalog, concurrency)
+                        age = catalog.age("space", username)
+                    except Exception as e:
+                        if age is None:
+                            raise
+                        print(f"⚠️ 同步失败，显示本地缓存的目录: {e}")
+                print_catalog(catalog.query("space", username, stage=stage, sdk=sdk, private=private, sort=sort), age)
+            finally:
+                catalog.close()
     except Exception as e:
         print(f"获取状态信息失败: {e}")
 
+def read_list_file(path):
+    """读取 Space 清单文件：每行一个名称或 id，忽略空行与 # 注释。"""
+    with open(path, encoding="utf-8") as f:
+        return [line.split("#", 1)[0].strip() for line in f if line.split("#", 1)[0].strip()]
+
+def select_spaces(api, names=(), list_file=None, match=None, sdk=None, stage=None, concurrency=RUNTIME_CONCURRENCY):
+    """
+    按选择器确定目标 Space。显式名称与清单文件直接补全为 id；
+    --match (对名称或完整 id 做 glob 匹配) / --sdk 从本地目录筛选 (过期时先增量同步)；
+    --stage 会对候选 Space 重新查询实时状态后再过滤，避免按过期的缓存状态误操作。
+    :return: 排好序的 repo_id 列表
+    """
+    explicit = list(names) + (read_list_file(list_file) if list_file else [])
+    targets = {resolve_repo_id(name, api) for name in explicit}
+    if match or sdk or (stage and not explicit):
+        username = get_username(api)
+        catalog = HubCatalog()
+        try:
+            age = catalog.age("space", username)
+            if age is None or age > CATALOG_MAX_AGE:
+                refresh_catalog(api, username, catalog, concurrency)
+            for row in catalog.query("space", username, sdk=sdk):
+                repo_id = row["id"]
+                if not match or fnmatch.fnmatch(repo_id.split("/")[-1], match) or fnmatch.fnmatch(repo_id, match):
+                    targets.add(repo_id)
+        finally:
+            catalog.close()
+    if stage and targets:
+        stages = {}
+
+        def on_result(repo_id, private, runtime, error):
+            stages[repo_id] = runtime.stage if runtime else "FETCH_ERROR"
+            return stages[repo_id]
+
+        spaces = [SimpleNamespace(id=repo_id, private=None) for repo_id in targets]
+        asyncio.run(stream_space_runtimes(api, spaces, concurrency, on_result))
+        targets = {repo_id for repo_id, current in stages.items() if current.upper() == stage.upper()}
+    return sorted(targets)
+
+def call_with_retry(fn, **kwargs):
+    """同步调用 Hub 接口，429/5xx/网络错误按 retry_delay 退避重试。"""
+    for attempt in range(RETRY_ATTEMPTS):
+        try:
+            return fn(**kwargs)
+        except Exception as e:
+            delay = retry_delay(e, attempt)
+            if delay is None or attempt == RETRY_ATTEMPTS - 1:
+                raise
+            time.sleep(delay)
+
 def action_space(space_id, action):
     api = get_api()
-    if "/" not in space_id:
-        username = get_username(api)
-        repo_id = f"{username}/{space_id}"
-    else:
-        repo_id = space_id
+    repo_id = resolve_repo_id(space_id, api)
         
     print(f"正在尝试对 [{repo_id}] 执行 [{action}] 操作...")
     try:
@@ -106,6 +259,189 @@ def action_space(space_id, action):
     except Exception as e:
         print(f"❌ 操作失败: {e}")
 
+def bulk_action(action, names=(), list_file=None, match=None, sdk=None, stage=None,
+                concurrency=ACTION_CONCURRENCY, assume_yes=False):
+    """
+    对选择器选中的一批 Space 并发执行生命周期操作：单个失败不影响其余，
+    每完成一个打印一行进度，最后汇总成功/失败与总耗时。
+    """
+    api = get_api()
+    try:
+        targets = select_spaces(api, names, list_file, match, sdk, stage)
+    except Exception as e:
+        print(f"❌ 选择目标 Space 失败: {e}")
+        return
+    if not targets:
+        print("没有匹配的 Space。")
+        return
+    if len(targets) == 1 and not (list_file or match or sdk or stage):
+        action_space(targets[0], action)
+        return
+
+    print(f"将对以下 {len(targets)} 个 Space 执行 [{action}]：")
+    for repo_id in targets:
+        print(f" - {repo_id}")
+    if not assume_yes:
+        confirm = input("⚠️ 确认继续吗？(y/N): ")
+        if confirm.lower() != 'y':
+            print("操作已取消。")
+            return
+
+    # wakeup 通常通过 restart 触发
+    fn = api.pause_space if action == "pause" else api.restart_space
+    start = time.perf_counter()
+    failed = []
+    width = len(str(len(targets)))
+
+    def run(repo_id):
+        t0 = time.perf_counter()
+        call_with_retry(fn, repo_id=repo_id)
+        return time.perf_counter() - t0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(run, repo_id): repo_id for repo_id in targets}
+        for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+            repo_id = futures[future]
+            try:
+                result = f"✅ {repo_id} ({future.result():.1f}s)"
+            except Exception as e:
+                failed.append((repo_id, e))
+                result = f"❌ {repo_id}: {e}"
+            print(f"[{done:>{width}}/{len(targets)}] 成功 {done - len(failed)} / 失败 {len(failed)} | {result}", flush=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n操作 [{action}] 完成：成功 {len(targets) - len(failed)}，失败 {len(failed)}，总耗时 {elapsed:.1f}s")
+    for repo_id, error in sorted(failed, key=lambda x: x[0]):
+        print(f" - {repo_id}: {error}")
+
+def is_transient(stage):
+    return "BUILDING" in stage or "STARTING" in stage
+
+def poll_interval(stage):
+    """按当前状态决定多久后再查：构建/启动中快，稳定状态慢，错误与未知状态居中。"""
+    if is_transient(stage):
+        return WATCH_FAST_INTERVAL
+    if stage in STABLE_STAGES:
+        return WATCH_SLOW_INTERVAL
+    return WATCH_ERROR_INTERVAL
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+def watch_spaces(names=(), list_file=None, match=None, sdk=None, stage=None,
+                 until_running=False, timeout=None, concurrency=RUNTIME_CONCURRENCY):
+    """
+    轮询一组 Space 的运行时，只在状态变化时输出一行 (含在上一状态停留的时长，构建结束时给出构建用时)。
+    每个 Space 按自己的状态单独安排下次轮询；until_running 时全部 RUNNING 即退出，
+    某个 Space 处于 *_ERROR 状态 (包括开始监视时就已如此) 则立即失败，不会一直等到超时。
+    :return: 进程退出码 (0 成功；1 超时/出错；130 被中断)
+    """
+    api = get_api()
+    try:
+        targets = select_spaces(api, names, list_file, match, sdk, stage)
+    except Exception as e:
+        print(f"❌ 选择目标 Space 失败: {e}")
+        return 1
+    if not targets:
+        print("没有匹配的 Space。")
+        return 1
+
+    mode = "，直到全部 RUNNING" if until_running else "，Ctrl+C 退出"
+    print(f"正在监视 {len(targets)} 个 Space 的状态变化{mode}...\n", flush=True)
+    start = time.monotonic()
+    deadline = start + timeout if timeout else None
+    # repo_id -> {"stage": 当前状态, "since": 进入该状态的时间, "build_start": 观察到开始构建的时间,
+    #             "seen_build": 是否从头看到构建, "failing": 是否处于连续查询失败中}
+    state = {repo_id: {"stage": None, "since": start, "build_start": None, "seen_build": False, "failing": False}
+             for repo_id in targets}
+    queue = [(start, repo_id) for repo_id in targets]
+    heapq.heapify(queue)
+
+    def fetch(repo_id):
+        try:
+            return repo_id, call_with_retry(api.get_space_runtime, repo_id=repo_id).stage, None
+        except Exception as e:
+            return repo_id, None, e
+
+    def report(repo_id, new_stage, now):
+        entry = state[repo_id]
+        old_stage = entry["stage"]
+        clock = time.strftime("%H:%M:%S")
+        name = repo_id.split("/")[-1]
+        if old_stage is None:
+            print(f"[{clock}] {name:<25} {stage_symbol(new_stage)} {new_stage}", flush=True)
+            if is_transient(new_stage):
+                entry["build_start"] = now
+        else:
+            line = f"[{clock}] {name:<25} {old_stage} → {stage_symbol(new_stage)} {new_stage} (停留 {format_duration(now - entry['since'])})"
+            if is_transient(new_stage) and not is_transient(old_stage):
+                entry["build_start"], entry["seen_build"] = now, True
+            elif is_transient(old_stage) and not is_transient(new_stage) and entry["build_start"] is not None:
+                # 开始观察时已在构建中的，只能给出下限
+                prefix = "" if entry["seen_build"] else "≥"
+                line += f"，构建用时 {prefix}{format_duration(now - entry['build_start'])}"
+                entry["build_start"] = None
+            print(line, flush=True)
+        entry["stage"], entry["since"] = new_stage, now
+
+    code = 0
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            while queue:
+                wait = queue[0][0] - time.monotonic()
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                if wait > 0:
+                    time.sleep(wait)
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                due = []
+                while queue and queue[0][0] <= now:
+                    due.append(heapq.heappop(queue)[1])
+                for repo_id, new_stage, error in executor.map(fetch, due):
+                    now = time.monotonic()
+                    entry = state[repo_id]
+                    if error is not None:
+                        # 查询失败不算一次观察：保留上一个状态与计时，连续失败只提示一次
+                        if not entry["failing"]:
+                            entry["failing"] = True
+                            print(f"[{time.strftime('%H:%M:%S')}] {repo_id.split('/')[-1]:<25} ⚠️ 查询失败，稍后重试: {error}",
+                                  flush=True)
+                        heapq.heappush(queue, (now + WATCH_ERROR_INTERVAL, repo_id))
+                        continue
+                    entry["failing"] = False
+                    old_stage = entry["stage"]
+                    if new_stage != old_stage:
+                        report(repo_id, new_stage, now)
+                        if until_running and "ERROR" in new_stage:
+                            verb = "处于" if old_stage is None else "进入"
+                            print(f"\n❌ {repo_id} {verb} {new_stage}，停止等待。")
+                            return 1
+                    if until_running and new_stage == "RUNNING":
+                        continue
+                    heapq.heappush(queue, (now + poll_interval(new_stage), repo_id))
+    except KeyboardInterrupt:
+        print("\n已停止监视。")
+        code = 130
+
+    elapsed = format_duration(time.monotonic() - start)
+    if until_running and code == 0:
+        pending = sorted(repo_id for repo_id, entry in state.items() if entry["stage"] != "RUNNING")
+        if not pending:
+            print(f"\n✅ 全部 {len(targets)} 个 Space 已 RUNNING，用时 {elapsed}")
+            return 0
+        print(f"\n⏱️ 等待超时 ({elapsed})，以下 {len(pending)} 个 Space 尚未 RUNNING：")
+        for repo_id in pending:
+            print(f" - {repo_id}: {state[repo_id]['stage'] or 'UNKNOWN'}")
+        return 1
+    return code
+
 def create_space(space_name, sdk, is_private):
     api = get_api()
     print(f"正在创建新的 Space: {space_name} (SDK: {sdk}, 私密: {is_private})...")
@@ -123,11 +459,7 @@ def create_space(space_name, sdk, is_private):
 
 def delete_space(space_id):
     api = get_api()
-    if "/" not in space_id:
-        username = get_username(api)
-        repo_id = f"{username}/{space_id}"
-    else:
-        repo_id = space_id
+    repo_id = resolve_repo_id(space_id, api)
         
     print(f"⚠️ 正在尝试删除 Space: [{repo_id}] ...")
     try:
@@ -138,11 +470,7 @@ def delete_space(space_id):
 
 def manage_config(space_id, category, key, value=None):
     api = get_api()
-    if "/" not in space_id:
-        username = get_username(api)
-        repo_id = f"{username}/{space_id}"
-    else:
-        repo_id = space_id
+    repo_id = resolve_repo_id(space_id, api)
 
     try:
         if category == "secrets":
@@ -186,11 +514,7 @@ def get_logs(space_id, log_type="run"):
     注：Container 日志在官方 API 路径中映射为 'run'
     """
     api = get_api()
-    if "/" not in space_id:
-        username = get_username(api)
-        repo_id = f"{username}/{space_id}"
-    else:
-        repo_id = space_id
+    repo_id = resolve_repo_id(space_id, api)
     
     print(f"正在建立 SSE 连接，获取 [{repo_id}] 的 {log_type} 日志...")
     
@@ -202,12 +526,11 @@ def get_logs(space_id, log_type="run"):
     }
     
     try:
-        import requests
         import json
         
-        # 使用 requests 的流式模式 (stream=True)
+        # 流式读取，复用 HfApi 的 keep-alive 连接 (上面解析 repo_id 时若发过请求，这里不再重新握手)
         # 注意: SSE 返回的是持续不断的文本流
-        with requests.get(url, headers=headers, stream=True, timeout=120) as r:
+        with open_stream(url, headers=headers, timeout=120) as (r, lines):
             if r.status_code != 200:
                 print(f"❌ 无法建立流式连接 (HTTP {r.status_code})")
                 try:
@@ -219,9 +542,8 @@ def get_logs(space_id, log_type="run"):
 
             print(f"✅ 连接成功。正在输出内容 (按 Ctrl+C 停止):\n" + "-"*30)
             
-            for line in r.iter_lines():
-                if line:
-                    decoded_line = line.decode('utf-8')
+            for decoded_line in lines:
+                if decoded_line:
                     # 只有以 data: 开头的行才包含实际日志内容
                     if decoded_line.startswith('data: '):
                         data_str = decoded_line[len('data: '):].strip()
@@ -243,11 +565,7 @@ def get_logs(space_id, log_type="run"):
 
 def manage_hardware(space_id, flavor=None):
     api = get_api()
-    if "/" not in space_id:
-        username = get_username(api)
-        repo_id = f"{username}/{space_id}"
-    else:
-        repo_id = space_id
+    repo_id = resolve_repo_id(space_id, api)
     
     try:
         if flavor is None:
@@ -266,10 +584,36 @@ if __name__ == "__main__":
 
     parser_list = subparsers.add_parser("list", help="列表展示状态与地址")
     parser_list.add_argument("space_id", nargs="?", help="查看特定 Space 详情 (可选)")
+    parser_list.add_argument("--concurrency", type=int, default=RUNTIME_CONCURRENCY, help="并发查询运行时的数量")
+    parser_list.add_argument("--refresh", action="store_true", help="立即与 Hub 增量同步本地目录")
+    parser_list.add_argument("--live", action="store_true", help="查询全部 Space 的实时状态 (逐行输出)")
+    parser_list.add_argument("--max-age", type=int, default=CATALOG_MAX_AGE, help="本地目录超过该秒数自动同步")
+    parser_list.add_argument("--stage", help="按状态过滤，如 RUNNING / PAUSED / SLEEPING")
+    parser_list.add_argument("--sdk", help="按 SDK 过滤，如 gradio / docker")
+    visibility = parser_list.add_mutually_exclusive_group()
+    visibility.add_argument("--private", dest="private", action="store_const", const=True, help="只看私有")
+    visibility.add_argument("--public", dest="private", action="store_const", const=False, help="只看公开")
+    parser_list.add_argument("--sort", choices=list(SORT_COLUMNS), default="name")
     
-    parser_action = subparsers.add_parser("action", help="生命周期管控")
-    parser_action.add_argument("space_id")
+    parser_action = subparsers.add_parser("action", help="生命周期管控 (支持按选择器批量执行)")
+    parser_action.add_argument("space_id", nargs="*", help="一个或多个 Space 名称/ID")
     parser_action.add_argument("op", choices=["restart", "pause", "wakeup"])
+    parser_action.add_argument("--match", help="按名称 glob 选择，如 'demo-*'")
+    parser_action.add_argument("--sdk", help="按 SDK 选择")
+    parser_action.add_argument("--stage", help="按当前实时状态选择，如 RUNNING / RUNTIME_ERROR")
+    parser_action.add_argument("--from-file", dest="list_file", help="从清单文件读取 Space (每行一个)")
+    parser_action.add_argument("--concurrency", type=int, default=ACTION_CONCURRENCY, help="并发执行数量")
+    parser_action.add_argument("-y", "--yes", action="store_true", help="批量操作时跳过确认")
+
+    parser_watch = subparsers.add_parser("watch", help="监视状态变化 (自适应轮询)")
+    parser_watch.add_argument("space_id", nargs="*", help="一个或多个 Space 名称/ID")
+    parser_watch.add_argument("--match", help="按名称 glob 选择，如 'demo-*'")
+    parser_watch.add_argument("--sdk", help="按 SDK 选择")
+    parser_watch.add_argument("--stage", help="按当前实时状态选择，如 BUILDING")
+    parser_watch.add_argument("--from-file", dest="list_file", help="从清单文件读取 Space (每行一个)")
+    parser_watch.add_argument("--until-running", action="store_true", help="全部 RUNNING 后退出 (退出码 0)，处于错误状态或超时则退出码 1")
+    parser_watch.add_argument("--timeout", type=float, help="最长监视秒数")
+    parser_watch.add_argument("--concurrency", type=int, default=RUNTIME_CONCURRENCY, help="并发查询数量")
 
     parser_create = subparsers.add_parser("create", help="新建 Space")
     parser_create.add_argument("name")
@@ -296,8 +640,19 @@ if __name__ == "__main__":
 
     args = parser.parse_args()
     
-    if args.command == "list": list_spaces(args.space_id)
-    elif args.command == "action": action_space(args.space_id, args.op)
+    if args.command == "list":
+        list_spaces(args.space_id, max(1, args.concurrency), args.refresh, args.live,
+                    args.stage, args.sdk, args.private, args.sort, args.max_age)
+    elif args.command == "action":
+        if not (args.space_id or args.list_file or args.match or args.sdk or args.stage):
+            parser_action.error("请指定 Space 名称或至少一个选择器 (--match/--sdk/--stage/--from-file)")
+        bulk_action(args.op, args.space_id, args.list_file, args.match, args.sdk, args.stage,
+                    args.concurrency, args.yes)
+    elif args.command == "watch":
+        if not (args.space_id or args.list_file or args.match or args.sdk or args.stage):
+            parser_watch.error("请指定 Space 名称或至少一个选择器 (--match/--sdk/--stage/--from-file)")
+        sys.exit(watch_spaces(args.space_id, args.list_file, args.match, args.sdk, args.stage,
+                              args.until_running, args.timeout, args.concurrency))
     elif args.command == "create": create_space(args.name, args.sdk, not args.public)
     elif args.command == "delete": delete_space(args.space_id)
     elif args.command == "config":
@@ -1,29 +1,962 @@
 import os
+import gzip
+import json
+import mmap
+import sqlite3
+import hashlib
 import shutil
+import time
+import atexit
+import signal
+import tempfile
+import threading
+import collections
+from datetime import datetime, timezone
+import concurrent.futures
 from pathlib import Path
-from huggingface_hub import HfApi, hf_hub_download, upload_folder, upload_file
+import requests
+from requests.adapters import HTTPAdapter
+from huggingface_hub import (
+    HfApi,
+    hf_hub_download,
+    hf_hub_url,
+    get_hf_file_metadata,
+    upload_folder,
+    upload_file,
+    CommitOperationAdd,
+    CommitOperationCopy,
+    CommitOperationDelete,
+)
+from huggingface_hub.errors import EntryNotFoundError
+from huggingface_hub.utils import build_hf_headers, filter_repo_objects, DEFAULT_IGNORE_PATTERNS
+
+HASH_BLOCK_SIZE = 1024 * 1024
+MANIFEST_NAME = "manifest.json"
+HASH_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+COPY_BLOCK_SIZE = 1024 * 1024
+RESTORE_MODES = ("cache", "direct", "hardlink")
+FSYNC_POLICIES = ("none", "file", "full")
+BATCH_WORKERS = 4
+# save_many / restore_many 的映射里每个路径可带的存储选项
+MAPPING_OPTIONS = {"codec", "chunked", "fsync"}
+HTTP_POOL_SIZE = 16
+HISTORY_DB_NAME = "history.sqlite"
+HISTORY_MAX_AGE = 60  # 秒：history() 在此时间内复用本地索引，不访问网络
+FICLONE = 0x40049409  # Linux ioctl: 在同一文件系统内创建写时复制 (reflink) 副本
+
+# 分块存储：内容定义分块 (CDC) 的块大小，以及云端块目录与清单后缀
+CHUNK_MIN_SIZE = 256 * 1024
+CHUNK_AVG_SIZE = 1024 * 1024
+CHUNK_MAX_SIZE = 4 * 1024 * 1024
+CHUNK_PREFIX = ".chunks"
+CHUNK_MANIFEST_SUFFIX = ".chunks.json"
+CHUNK_FORMAT_VERSION = 1
+# 分块恢复时本地旧文件与目标大小相差超过该倍数，多半已无可复用的块，跳过逐字节扫描直接下载
+CHUNK_REUSE_MAX_RATIO = 2
+# Gear 滚动哈希表，由固定种子派生，保证不同进程/版本切出相同的块边界
+GEAR = [int.from_bytes(hashlib.sha256(b"gear-%d" % i).digest()[:4], "big") for i in range(256)]
+
+
+def file_digest(path):
+    """
+    单次读取同时计算 sha256 (LFS 文件的 oid) 与 git blob sha1 (普通文件的 oid)。
+    """
+    size = os.path.getsize(path)
+    sha256 = hashlib.sha256()
+    git_sha1 = hashlib.sha1(f"blob {size}\0".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            sha256.update(block)
+            git_sha1.update(block)
+    return {"sha256": sha256.hexdigest(), "git_oid": git_sha1.hexdigest(), "size": size}
+
+
+def remote_oid(entry):
+    """
+    从 get_paths_info / list_repo_tree 返回的 RepoFile 中取出内容 oid：
+    LFS 文件取 sha256，普通文件取 git blob id。
+    """
+    lfs = getattr(entry, "lfs", None)
+    if lfs:
+        return lfs["sha256"] if isinstance(lfs, dict) else lfs.sha256
+    return getattr(entry, "blob_id", None)
+
+
+def _gzip_compress(fsrc, fdst, level=None):
+    # mtime=0 且不写文件名，相同内容总是得到相同的压缩结果，云端 oid 比对才有意义
+    with gzip.GzipFile(filename="", mode="wb", fileobj=fdst, compresslevel=level or 6, mtime=0) as out:
+        shutil.copyfileobj(fsrc, out, COPY_BLOCK_SIZE)
+
+
+def _gzip_decompress(fsrc, fdst):
+    with gzip.GzipFile(fileobj=fsrc, mode="rb") as src:
+        shutil.copyfileobj(src, fdst, COPY_BLOCK_SIZE)
+
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd 编解码需要安装可选依赖: pip install zstandard")
+    return zstandard
+
+
+def _zstd_compress(fsrc, fdst, level=None):
+    _zstd().ZstdCompressor(level=level or 3).copy_stream(fsrc, fdst, read_size=COPY_BLOCK_SIZE)
+
+
+def _zstd_decompress(fsrc, fdst):
+    _zstd().ZstdDecompressor().copy_stream(fsrc, fdst, read_size=COPY_BLOCK_SIZE)
+
+
+def _lz4_frame():
+    try:
+        import lz4.frame
+    except ImportError:
+        raise RuntimeError("lz4 编解码需要安装可选依赖: pip install lz4")
+    return lz4.frame
+
+
+def _lz4_compress(fsrc, fdst, level=None):
+    with _lz4_frame().open(fdst, mode="wb", compression_level=level or 0) as out:
+        shutil.copyfileobj(fsrc, out, COPY_BLOCK_SIZE)
+
+
+def _lz4_decompress(fsrc, fdst):
+    with _lz4_frame().open(fsrc, mode="rb") as src:
+        shutil.copyfileobj(src, fdst, COPY_BLOCK_SIZE)
+
+
+# 编解码器注册表: 名称 -> (云端文件后缀, compress(fsrc, fdst, level), decompress(fsrc, fdst))
+CODECS = {
+    "gzip": (".gz", _gzip_compress, _gzip_decompress),
+    "zstd": (".zst", _zstd_compress, _zstd_decompress),
+    "lz4": (".lz4", _lz4_compress, _lz4_decompress),
+}
+
+
+def register_codec(name, suffix, compress, decompress):
+    """注册自定义编解码器。compress/decompress 均以流的方式读写文件对象。"""
+    CODECS[name] = (suffix, compress, decompress)
+
+
+def compress_file(src, dst, codec, level=None):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        CODECS[codec][1](fsrc, fdst, level)
+
+
+def decompress_file(src, dst, codec):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        CODECS[codec][2](fsrc, fdst)
+
+
+def chunk_path(sha256, prefix=CHUNK_PREFIX):
+    """块在 Dataset 中的路径，按哈希前两位分目录，避免单目录文件过多。"""
+    return f"{prefix}/{sha256[:2]}/{sha256}"
+
+
+def _find_cut(buf, start, end, min_size, mask):
+    """
+    在 [start, end) 内用 Gear 哈希寻找块边界。32 位哈希左移，边界只取决于最近 32 个字节。
+    """
+    if end - start <= min_size:
+        return end
+    gear = GEAR
+    h = 0
+    pos = start + min_size - 32
+    boundary = start + min_size
+    for b in buf[pos:end]:
+        h = ((h << 1) + gear[b]) & 0xFFFFFFFF
+        pos += 1
+        if not h & mask and pos > boundary:
+            return pos
+    return end
+
+
+def cdc_chunks(path, previous=(), min_size=CHUNK_MIN_SIZE, avg_size=CHUNK_AVG_SIZE, max_size=CHUNK_MAX_SIZE,
+               limit=None):
+    """
+    内容定义分块，返回 [(offset, length, sha256), ...]。
+    纯 Python 的滚动哈希较慢 (约 5-6 MB/s)，因此优先沿用上一版本的块列表 previous=[(sha256, length), ...]：
+    若当前位置的内容与预期的旧块一致（C 速度的 sha256 校验），直接接受该块，只有变化的区域才逐字节扫描。
+    结果与完整扫描完全一致，因为块边界只由块内容决定。没有可沿用的块列表时 (首次分块) 需要完整扫描，
+    GB 级文件要数分钟。
+    :param limit: 扫描到该偏移量即停止 (只返回此前的块)，用于限制恢复时扫描本地旧文件的开销
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bits = avg_size.bit_length() - 1
+    mask = ((1 << bits) - 1) << (32 - bits)
+    previous = [tuple(c) for c in previous]
+    follow = {}
+    for i, (sha, _length) in enumerate(previous):
+        nxt = previous[i + 1] if i + 1 < len(previous) else None
+        follow.setdefault(sha, nxt)
+    last = previous[-1] if previous else None
+
+    chunks = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        off = 0
+        expect = previous[0] if previous else None
+        end = size if limit is None else min(size, limit)
+        while off < end:
+            if expect:
+                sha, length = expect
+                # 旧版本的最后一块是被文件结尾截断的，只有同样位于结尾时才能直接沿用
+                fits = off + length == size if expect == last else off + length <= size
+                if fits and hashlib.sha256(mm[off:off + length]).hexdigest() == sha:
+                    chunks.append((off, length, sha))
+                    off += length
+                    expect = follow.get(sha)
+                    continue
+            cut = _find_cut(mm, off, min(size, off + max_size), min_size, mask)
+            sha = hashlib.sha256(mm[off:cut]).hexdigest()
+            chunks.append((off, cut - off, sha))
+            off = cut
+            # 切出的块若在旧版本中出现过，说明已重新对齐，继续沿用旧块序列
+            expect = follow.get(sha)
+    return chunks
+
+
+def snapshot_sqlite(db_path, dest_path, method="backup"):
+    """
+    生成 SQLite 数据库的一致性快照，不需要停止写入方。
+    - "backup": 在线备份 API，一次性复制全部页面。WAL 模式下读事务不阻塞写入方。
+    - "vacuum": VACUUM INTO，输出经过整理压缩的副本（较慢，但体积更小）。
+    """
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+    src = sqlite3.connect(db_path)
+    try:
+        if method == "vacuum":
+            src.execute("VACUUM INTO ?", (str(dest_path),))
+        elif method == "backup":
+            dst = sqlite3.connect(dest_path)
+            try:
+                # pages=-1：在单个读事务内完成复制，快照不会因并发写入而重启
+                src.backup(dst, pages=-1)
+            finally:
+                dst.close()
+        else:
+            raise ValueError(f"未知的快照方式: {method}，可选: backup / vacuum")
+    finally:
+        src.close()
+
+
+def check_sqlite(db_path):
+    """执行 PRAGMA integrity_check，返回 (是否通过, 检查信息)。"""
+    conn = sqlite3.connect(f"file:{Path(db_path).as_posix()}?mode=ro", uri=True)
+    try:
+        rows = [r[0] for r in conn.execute("PRAGMA integrity_check").fetchall()]
+    except sqlite3.DatabaseError as e:
+        return False, str(e)
+    finally:
+        conn.close()
+    return rows == ["ok"], "; ".join(rows[:5])
+
+
+def _to_timestamp(value):
+    """Unix 时间戳 / datetime / ISO 8601 字符串 -> 浮点时间戳。无时区的 datetime 按本地时间处理。"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return value.timestamp()
+
+
+def _reflink(src, dst):
+    """尝试 reflink (btrfs/xfs 等支持写时复制的文件系统)，不支持时返回 False。"""
+    try:
+        import fcntl
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def atomic_install(target, writer, fsync="file"):
+    """
+    在目标文件同目录下生成临时文件，由 writer(tmp_path) 写入内容后原子地 rename 到目标位置。
+    进程中途被杀时目标文件要么是旧版本，要么是完整的新版本。
+    :param writer: 接收临时文件路径的回调，负责写入内容
+    :param fsync: "none" 不落盘；"file" 在 rename 前 fsync 文件；"full" 额外 fsync 所在目录
+    """
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f"未知的 fsync 策略: {fsync}，可选: {FSYNC_POLICIES}")
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        writer(tmp)
+        if fsync != "none":
+            with open(tmp, "rb+") as f:
+                os.fsync(f.fileno())
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if fsync == "full" and os.name != "nt":
+        dir_fd = os.open(target.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
 
 class PersistenceManager:
     """
     HuggingFace Space 持久化层：利用私有 Dataset 进行数据备份与恢复。
     适用于免费 Tier 的 Space 避免重启后数据丢失。
     """
-    def __init__(self, dataset_id=None, token=None):
+    def __init__(self, dataset_id=None, token=None, state_dir=None):
         self.api = HfApi(token=token or os.environ.get("HF_TOKEN"))
         self.dataset_id = dataset_id or os.environ.get("DATASET_REPO_ID")
         
         if not self.dataset_id:
             raise ValueError("未指定 DATASET_REPO_ID，请在初始化或环境变量中提供。格式：'username/dataset-name'")
 
-    def restore(self, remote_path, local_path, is_folder=False):
+        # 本地状态目录：存放内容哈希清单 (manifest)，用于跳过未变化的上传
+        base = state_dir or os.environ.get("HF_PERSIST_STATE_DIR") or str(Path.home() / ".cache" / "hf-persistence")
+        self.state_dir = Path(base) / self.dataset_id.replace("/", "--")
+        self.manifest_path = self.state_dir / MANIFEST_NAME
+        self.manifest = self._load_manifest()
+        # 清单可能被后台线程 (WriteBehindSaver) 与调用方同时更新
+        self._lock = threading.RLock()
+        # 直接下载共用的 keep-alive 连接池，restore_many 的多个线程复用同一批连接
+        self.http = requests.Session()
+        self.http.mount("https://", HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+
+    def _load_manifest(self):
+        try:
+            data = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            if isinstance(data, dict):
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"[Warning] 清单文件损坏，已忽略: {e}")
+        return {}
+
+    def _save_manifest(self):
+        with self._lock:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            tmp = self.manifest_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+            os.replace(tmp, self.manifest_path)
+
+    def _local_digest(self, local_path, remote_path):
+        """
+        计算本地文件的内容哈希。若 size 与 mtime 和清单记录一致，直接复用记录，不再重读文件。
+        """
+        st = os.stat(local_path)
+        abs_path = os.path.abspath(local_path)
+        entry = self.manifest.get(remote_path)
+        if (entry and entry.get("local_path") == abs_path
+                and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns):
+            return {"sha256": entry["sha256"], "git_oid": entry["git_oid"], "size": entry["size"]}
+        return file_digest(local_path)
+
+    def _record(self, local_path, remote_path, digest, commit=None, etag=None, persist=True):
+        st = os.stat(local_path)
+        with self._lock:
+            entry = dict(self.manifest.get(remote_path, {}))
+            for key in ("format", "chunks", "manifest_oids", "codec", "remote_oids"):
+                entry.pop(key, None)
+            entry.update(digest)
+            entry.update({
+                "local_path": os.path.abspath(local_path),
+                "mtime_ns": st.st_mtime_ns,
+                "size": st.st_size,
+            })
+            if commit:
+                entry["commit"] = commit
+            if etag:
+                entry["etag"] = etag
+            self.manifest[remote_path] = entry
+            if persist:
+                self._save_manifest()
+
+    def _fetch_remote_oids(self, remote_paths, revision="main"):
+        """
+        一次请求查询多个云端文件当前的 oid，返回 {path: oid}，不存在的文件不出现在结果中。
+        网络错误向上抛出，由调用方决定是否回退到本地清单。
+        """
+        infos = self.api.get_paths_info(
+            repo_id=self.dataset_id,
+            paths=list(remote_paths),
+            repo_type="dataset",
+            revision=revision,
+        )
+        return {info.path: remote_oid(info) for info in infos if hasattr(info, "blob_id")}
+
+    def _fetch_remote_oid(self, remote_path):
+        """查询单个云端文件当前的 oid，文件不存在时返回 None。"""
+        return self._fetch_remote_oids([remote_path]).get(remote_path)
+
+    def is_unchanged(self, local_path, remote_path, digest=None):
+        """
+        判断本地文件与云端是否一致。优先比对云端 LFS/blob oid；云端不可达时回退到本地清单。
+        """
+        digest = digest or self._local_digest(local_path, remote_path)
+        try:
+            oid = self._fetch_remote_oid(remote_path)
+            return oid in (digest["sha256"], digest["git_oid"])
+        except Exception as e:
+            print(f"[Warning] 无法查询云端文件信息，改用本地清单比对: {e}")
+            entry = self.manifest.get(remote_path)
+            return bool(entry) and entry.get("sha256") == digest["sha256"]
+
+    @staticmethod
+    def _is_ignored(rel_path):
+        """与 upload_folder 相同的默认忽略规则：.git 与 snapshot_download 生成的 .cache/huggingface。"""
+        return not list(filter_repo_objects([rel_path], ignore_patterns=DEFAULT_IGNORE_PATTERNS))
+
+    def _list_remote_tree(self, remote_prefix):
+        """
+        列出云端目录下的全部文件，返回 {path_in_repo: RepoFile}。目录不存在时返回空字典。
+        """
+        try:
+            items = self.api.list_repo_tree(
+                repo_id=self.dataset_id,
+                path_in_repo=remote_prefix or None,
+                recursive=True,
+                repo_type="dataset",
+                revision="main",
+            )
+            return {item.path: item for item in items if hasattr(item, "blob_id")}
+        except EntryNotFoundError:
+            return {}
+
+    def _plan_file(self, local_path, remote_path, force=False):
+        """
+        为单文件生成提交计划：内容未变化时 operations 为空，只刷新清单记录。
+        """
+        digest = self._local_digest(local_path, remote_path)
+        operations = []
+        if force or not self.is_unchanged(local_path, remote_path, digest):
+            operations.append(CommitOperationAdd(path_in_repo=remote_path, path_or_fileobj=local_path))
+        return {
+            "operations": operations,
+            "records": [(local_path, remote_path, digest)],
+            "forget": [],
+            "counts": {"added": len(operations), "copied": 0, "deleted": 0},
+        }
+
+    def _plan_folder(self, local_path, remote_path, delete_missing=True, max_workers=HASH_WORKERS,
+                     allow_root_delete=False):
+        """
+        比对本地与云端目录树，生成只包含新增、复制、删除操作的提交计划。
+        本地与云端两侧都按 DEFAULT_IGNORE_PATTERNS 过滤；.gitattributes 永不删除；
+        同步到仓库根目录时云端的其他文件不一定属于这个文件夹，除非 allow_root_delete 否则不做删除。
+        """
+        remote_prefix = remote_path.strip("/")
+        local_root = Path(local_path)
+        local_files = {}
+        for path in local_root.rglob("*"):
+            rel_posix = path.relative_to(local_root).as_posix()
+            if not path.is_file() or self._is_ignored(rel_posix):
+                continue
+            local_files[f"{remote_prefix}/{rel_posix}" if remote_prefix else rel_posix] = str(path)
+
+        # 哈希计算在线程池中进行 (hashlib 在大块数据上会释放 GIL)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {rp: executor.submit(self._local_digest, lp, rp) for rp, lp in local_files.items()}
+            digests = {rp: f.result() for rp, f in futures.items()}
+
+        remote_files = {
+            rp: info for rp, info in self._list_remote_tree(remote_prefix).items()
+            if not self._is_ignored(rp[len(remote_prefix) + 1:] if remote_prefix else rp)
+        }
+        lfs_by_sha = {}
+        for rp, info in remote_files.items():
+            if getattr(info, "lfs", None):
+                lfs_by_sha.setdefault(remote_oid(info), rp)
+
+        operations = []
+        forget = []
+        counts = {"added": 0, "copied": 0, "deleted": 0}
+        for rp, lp in sorted(local_files.items()):
+            digest = digests[rp]
+            info = remote_files.get(rp)
+            if info is not None and remote_oid(info) in (digest["sha256"], digest["git_oid"]):
+                continue
+            src = lfs_by_sha.get(digest["sha256"])
+            if src:
+                # 云端已有相同内容的 LFS 文件，服务端复制即可，无需重新上传
+                operations.append(CommitOperationCopy(src_path_in_repo=src, path_in_repo=rp))
+                counts["copied"] += 1
+            else:
+                operations.append(CommitOperationAdd(path_in_repo=rp, path_or_fileobj=lp))
+                counts["added"] += 1
+
+        if delete_missing:
+            missing = sorted(rp for rp in remote_files
+                             if rp not in local_files and rp.rsplit("/", 1)[-1] != ".gitattributes")
+            if missing and not remote_prefix and not allow_root_delete:
+                print(f"[Warning] 同步到仓库根目录时默认不删除云端文件，已跳过 {len(missing)} 个删除 "
+                      "(如确需删除请传入 allow_root_delete=True)。")
+            elif missing and not local_files:
+                # 本地目录为空多半是尚未恢复，避免误删云端全部数据
+                print("[Warning] 本地目录为空，已跳过云端删除。")
+            else:
+                operations.extend(CommitOperationDelete(path_in_repo=rp) for rp in missing)
+                forget.extend(missing)
+                counts["deleted"] = len(missing)
+
+        return {
+            "operations": operations,
+            "records": [(lp, rp, digests[rp]) for rp, lp in local_files.items()],
+            "forget": forget,
+            "counts": counts,
+        }
+
+    def _existing_paths(self, paths, batch_size=500):
+        """批量查询哪些路径已存在于云端。"""
+        existing = set()
+        for i in range(0, len(paths), batch_size):
+            infos = self.api.get_paths_info(
+                repo_id=self.dataset_id,
+                paths=paths[i:i + batch_size],
+                repo_type="dataset",
+                revision="main",
+            )
+            existing.update(info.path for info in infos)
+        return existing
+
+    def _plan_chunked(self, local_path, remote_path, force=False):
+        """
+        分块格式的提交计划：文件按内容定义分块，块以 sha256 命名存放在 CHUNK_PREFIX 下，
+        每个版本只新增 `<remote_path>.chunks.json` 清单和云端尚不存在的块。
+        """
+        manifest_path = remote_path + CHUNK_MANIFEST_SUFFIX
+        digest = self._local_digest(local_path, remote_path)
+        entry = self.manifest.get(remote_path, {})
+        was_chunked = entry.get("format") == "chunked"
+        try:
+            current_oid = self._fetch_remote_oid(manifest_path)
+        except Exception as e:
+            print(f"[Warning] 无法查询云端分块清单，改用本地清单比对: {e}")
+            current_oid = (entry.get("manifest_oids") or [None])[0]
+
+        def unchanged_plan(extra):
+            return {
+                "operations": [],
+                "records": [(local_path, remote_path, {**digest, **extra})],
+                "forget": [],
+                "counts": {"added": 0, "copied": 0, "deleted": 0},
+            }
+
+        keep = {k: entry[k] for k in ("format", "chunks", "manifest_oids") if k in entry}
+        if (not force and was_chunked and entry.get("sha256") == digest["sha256"]
+                and current_oid in entry.get("manifest_oids", [])):
+            return unchanged_plan(keep)
+
+        previous = entry.get("chunks", []) if was_chunked else []
+        chunks = cdc_chunks(local_path, previous=previous)
+        chunk_list = [[sha, length] for _, length, sha in chunks]
+        body = json.dumps({
+            "format": CHUNK_FORMAT_VERSION,
+            "size": digest["size"],
+            "sha256": digest["sha256"],
+            "chunking": {"min": CHUNK_MIN_SIZE, "avg": CHUNK_AVG_SIZE, "max": CHUNK_MAX_SIZE},
+            "chunks": chunk_list,
+        }, separators=(",", ":")).encode("utf-8")
+        body_digest = {
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "git_oid": hashlib.sha1(b"blob %d\0" % len(body) + body).hexdigest(),
+        }
+        extra = {
+            "format": "chunked",
+            "chunks": chunk_list,
+            "manifest_oids": [body_digest["git_oid"], body_digest["sha256"]],
+        }
+        if not force and current_oid in extra["manifest_oids"]:
+            return unchanged_plan(extra)
+
+        # 上一版本引用的块必然已在云端，其余的块批量查询
+        known = {sha for sha, _ in previous}
+        candidates = sorted({sha for _, _, sha in chunks} - known)
+        existing = self._existing_paths([chunk_path(sha) for sha in candidates])
+
+        operations = []
+        cleanup = []
+        staging = self.state_dir / "staging"
+        staging.mkdir(parents=True, exist_ok=True)
+        queued = set()
+        try:
+            with open(local_path, "rb") as f:
+                for off, length, sha in chunks:
+                    path = chunk_path(sha)
+                    if sha in known or path in existing or sha in queued:
+                        continue
+                    queued.add(sha)
+                    # 新块写到暂存文件再交给 create_commit，内存占用不随文件大小增长
+                    tmp = staging / f"{sha}.{os.getpid()}.{threading.get_ident()}"
+                    f.seek(off)
+                    tmp.write_bytes(f.read(length))
+                    cleanup.append(str(tmp))
+                    operations.append(CommitOperationAdd(path_in_repo=path, path_or_fileobj=str(tmp)))
+        except BaseException:
+            for tmp in cleanup:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+            raise
+        operations.append(CommitOperationAdd(path_in_repo=manifest_path, path_or_fileobj=body))
+        print(f"[*] 分块: 共 {len(chunks)} 块，需上传 {len(queued)} 块。")
+        return {
+            "operations": operations,
+            "records": [(local_path, remote_path, {**digest, **extra})],
+            "forget": [],
+            "counts": {"added": len(operations), "copied": 0, "deleted": 0},
+            "cleanup": cleanup,
+        }
+
+    def _plan_compressed(self, local_path, remote_path, codec, force=False, level=None):
+        """
+        压缩格式的提交计划：流式压缩到暂存文件后上传为 `<remote_path><后缀>`，
+        同一 commit 中删除该路径其他编码的旧版本，保证恢复时自动识别的结果唯一。
+        """
+        if codec not in CODECS:
+            raise ValueError(f"未知的编解码器: {codec}，可选: {sorted(CODECS)}")
+        stored_path = remote_path + CODECS[codec][0]
+        digest = self._local_digest(local_path, remote_path)
+        entry = self.manifest.get(remote_path, {})
+        known_oids = entry.get("remote_oids", []) if entry.get("codec") == codec else []
+        variants = [remote_path] + [remote_path + suffix for suffix, _, _ in CODECS.values()]
+        try:
+            existing = self._fetch_remote_oids(variants)
+            current = existing.get(stored_path)
+            stale = sorted(p for p in existing if p != stored_path)
+        except Exception as e:
+            print(f"[Warning] 无法查询云端文件信息，改用本地清单比对: {e}")
+            current = known_oids[0] if known_oids else None
+            stale = []
+
+        def plan(operations, extra, cleanup=()):
+            return {
+                "operations": operations,
+                "records": [(local_path, remote_path, {**digest, **extra})],
+                "forget": [],
+                "counts": {"added": len(operations) - len(stale), "copied": 0, "deleted": len(stale)},
+                "cleanup": list(cleanup),
+            }
+
+        if not force and not stale and entry.get("sha256") == digest["sha256"] and current in known_oids:
+            return plan([], {"codec": codec, "remote_oids": known_oids})
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.state_dir, prefix="compress-", suffix=CODECS[codec][0])
+        os.close(fd)
+        try:
+            compress_file(local_path, tmp, codec, level=level)
+            packed = file_digest(tmp)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        extra = {"codec": codec, "remote_oids": [packed["git_oid"], packed["sha256"]]}
+        operations = []
+        if force or current not in extra["remote_oids"]:
+            operations.append(CommitOperationAdd(path_in_repo=stored_path, path_or_fileobj=tmp))
+            print(f"[*] {codec} 压缩: {digest['size']} -> {packed['size']} bytes")
+        operations.extend(CommitOperationDelete(path_in_repo=p) for p in stale)
+        return plan(operations, extra, cleanup=[tmp])
+
+    def _commit_plans(self, plans, commit_message):
+        """
+        把多个提交计划合并为同一个 commit（没有任何变更时不提交），并更新清单。返回 commit sha 或 None。
+        """
+        operations = [op for plan in plans for op in plan["operations"]]
+        commit = None
+        try:
+            if operations:
+                commit_info = self.api.create_commit(
+                    repo_id=self.dataset_id,
+                    repo_type="dataset",
+                    operations=operations,
+                    commit_message=commit_message,
+                    revision="main",
+                )
+                commit = getattr(commit_info, "oid", None)
+        finally:
+            for plan in plans:
+                for tmp in plan.get("cleanup", []):
+                    if os.path.exists(tmp):
+                        os.remove(tmp)
+        with self._lock:
+            for plan in plans:
+                for lp, rp, digest in plan["records"]:
+                    self._record(lp, rp, digest, commit=commit, persist=False)
+                for rp in plan["forget"]:
+                    self.manifest.pop(rp, None)
+            self._save_manifest()
+        return commit
+
+    def sync_folder(self, local_path, remote_path, commit_message="Persist data from Space",
+                    delete_missing=True, max_workers=HASH_WORKERS, allow_root_delete=False):
+        """
+        增量同步整个文件夹：比对本地与云端目录树，只把需要新增、复制、删除的文件放进同一个 commit。
+        :param delete_missing: 删除云端存在但本地已不存在的文件 (.gitattributes 除外)
+        :param max_workers: 并行计算哈希的线程数
+        :param allow_root_delete: remote_path 为仓库根目录时也执行删除 (默认跳过，避免删掉文件夹以外的文件)
+        :return: 同 save()，额外包含 "added" / "copied" / "deleted" 计数
+        """
+        plan = self._plan_folder(local_path, remote_path, delete_missing=delete_missing, max_workers=max_workers,
+                                 allow_root_delete=allow_root_delete)
+        counts = plan["counts"]
+        commit = self._commit_plans([plan], commit_message)
+        result = {"status": "skipped", "remote_path": remote_path, "commit": commit, "error": None, **counts}
+        if plan["operations"]:
+            result["status"] = "uploaded"
+            print(f"[OK] 文件夹已同步: 新增 {counts['added']}，复制 {counts['copied']}，删除 {counts['deleted']}。")
+        else:
+            print("[OK] 文件夹内容未变化，跳过提交。")
+        return result
+
+    def _fetch_file_metadata(self, remote_path, revision="main"):
+        """
+        通过一次 HEAD 请求获取云端文件的 commit sha 与 etag（LFS 文件为 sha256，普通文件为 git blob id）。
+        """
+        url = hf_hub_url(self.dataset_id, remote_path, repo_type="dataset", revision=revision)
+        return get_hf_file_metadata(url, token=self.api.token)
+
+    def _download_direct(self, remote_path, revision, tmp_path):
+        """
+        绕过 hub 缓存，把文件流式写入临时文件，内存占用恒定为一个块。返回边下边算的内容哈希。
+        """
+        url = hf_hub_url(self.dataset_id, remote_path, repo_type="dataset", revision=revision)
+        headers = build_hf_headers(token=self.api.token)
+        headers["Accept-Encoding"] = "identity"
+        sha256 = hashlib.sha256()
+        git_sha1 = None
+        size = 0
+        with self.http.get(url, headers=headers, stream=True, timeout=(10, 120)) as r:
+            r.raise_for_status()
+            total = r.headers.get("Content-Length")
+            if total is not None:
+                git_sha1 = hashlib.sha1(f"blob {total}\0".encode())
+            with open(tmp_path, "wb") as f:
+                for block in r.iter_content(chunk_size=COPY_BLOCK_SIZE):
+                    f.write(block)
+                    sha256.update(block)
+                    if git_sha1:
+                        git_sha1.update(block)
+                    size += len(block)
+        if git_sha1 is None or int(total) != size:
+            return file_digest(tmp_path)
+        return {"sha256": sha256.hexdigest(), "git_oid": git_sha1.hexdigest(), "size": size}
+
+    def _install_from_cache(self, remote_path, revision, local_path, mode, fsync):
+        downloaded_path = hf_hub_download(
+            repo_id=self.dataset_id,
+            repo_type="dataset",
+            filename=remote_path,
+            token=self.api.token,
+            revision=revision,
+        )
+        blob = os.path.realpath(downloaded_path)
+
+        def writer(tmp):
+            if mode == "hardlink":
+                # 硬链接与缓存共用 inode：仅适合只读使用，原地修改会连带改写缓存
+                try:
+                    os.remove(tmp)
+                    os.link(blob, tmp)
+                    return
+                except OSError:
+                    pass
+            if not _reflink(blob, tmp):
+                with open(blob, "rb") as fsrc, open(tmp, "wb") as fdst:
+                    shutil.copyfileobj(fsrc, fdst, COPY_BLOCK_SIZE)
+
+        atomic_install(local_path, writer, fsync=fsync)
+
+    def _fetch_bytes(self, remote_path, revision):
+        url = hf_hub_url(self.dataset_id, remote_path, repo_type="dataset", revision=revision)
+        r = self.http.get(url, headers=build_hf_headers(token=self.api.token), timeout=(10, 120))
+        r.raise_for_status()
+        return r.content
+
+    def _fetch_chunk(self, sha, revision, dest):
+        data = self._fetch_bytes(chunk_path(sha), revision)
+        if hashlib.sha256(data).hexdigest() != sha:
+            raise ValueError(f"块校验失败: {sha}")
+        Path(dest).write_bytes(data)
+
+    def _restore_chunked(self, remote_path, local_path, force=False, fsync="file", max_workers=BATCH_WORKERS * 2,
+                         revision="main"):
+        """
+        从分块格式恢复：读取版本清单，本地已有文件中内容相同的块直接复用，只并行下载缺失的块，
+        然后在目标旁组装、校验整体 sha256 并原子替换。
         """
-        从 Dataset 恢复数据到本地。
+        manifest_path = remote_path + CHUNK_MANIFEST_SUFFIX
+        meta = self._fetch_file_metadata(manifest_path, revision=revision)
+        result = {"status": "failed", "remote_path": remote_path, "commit": meta.commit_hash, "error": None}
+        entry = self.manifest.get(remote_path, {})
+        has_local = os.path.isfile(local_path)
+        local_digest = self._local_digest(local_path, remote_path) if has_local else None
+        if (not force and has_local and entry.get("format") == "chunked"
+                and meta.etag in entry.get("manifest_oids", [])
+                and local_digest["sha256"] == entry.get("sha256")):
+            print(f"[OK] 云端未变化 (commit {str(meta.commit_hash)[:8]})，跳过下载。")
+            result["status"] = "skipped"
+            return result
+
+        revision = meta.commit_hash or "main"
+        body = json.loads(self._fetch_bytes(manifest_path, revision))
+        chunk_list = [tuple(c) for c in body["chunks"]]
+
+        # 本地旧文件里已有的块：以目标版本的块序列为参照重新对齐，未变化的区域只需 sha256 校验。
+        # 变化区域要逐字节扫描 (约 5-6 MB/s)，所以大小相差悬殊时直接跳过，扫描也不超过目标文件的大小
+        reuse = {}
+        target_size = body.get("size") or sum(length for _, length in chunk_list)
+        local_size = os.path.getsize(local_path) if has_local else 0
+        if has_local and target_size and local_size and \
+                max(local_size, target_size) <= CHUNK_REUSE_MAX_RATIO * min(local_size, target_size):
+            for off, length, sha in cdc_chunks(local_path, previous=chunk_list, limit=target_size):
+                reuse.setdefault(sha, (off, length))
+        missing = sorted({sha for sha, _ in chunk_list} - set(reuse))
+        print(f"[*] 分块恢复: 共 {len(chunk_list)} 块，本地复用 {len(chunk_list) - len(missing)}，需下载 {len(missing)}。")
+
+        target = Path(local_path)
+        staging = target.parent / f".{target.name}.chunks"
+        staging.mkdir(parents=True, exist_ok=True)
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [executor.submit(self._fetch_chunk, sha, revision, staging / sha) for sha in missing]
+                for future in futures:
+                    future.result()
+
+            def writer(tmp):
+                sha256 = hashlib.sha256()
+                old = open(local_path, "rb") if reuse else None
+                try:
+                    with open(tmp, "wb") as out:
+                        for sha, length in chunk_list:
+                            if sha in reuse:
+                                old.seek(reuse[sha][0])
+                                data = old.read(length)
+                            else:
+                                data = (staging / sha).read_bytes()
+                            sha256.update(data)
+                            out.write(data)
+                finally:
+                    if old:
+                        old.close()
+                if sha256.hexdigest() != body["sha256"]:
+                    raise ValueError("组装后的文件校验失败")
+
+            atomic_install(local_path, writer, fsync=fsync)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        digest = file_digest(local_path)
+        self._record(local_path, remote_path, {
+            **digest,
+            "format": "chunked",
+            "chunks": [list(c) for c in chunk_list],
+            "manifest_oids": [meta.etag],
+        }, commit=meta.commit_hash)
+        result["status"] = "restored"
+        print(f"[OK] 文件已更新: {local_path} (Size: {digest['size']} bytes)")
+        return result
+
+    def _resolve_stored(self, remote_path, codec="auto", revision="main"):
+        """
+        确定云端实际存放的文件及其编码，返回 (codec, stored_path, metadata)。
+        codec="auto" 时先按原始路径查询，不存在时再一次性查找各压缩后缀。
+        """
+        if codec not in (None, "auto"):
+            stored_path = remote_path + CODECS[codec][0]
+            return codec, stored_path, self._fetch_file_metadata(stored_path, revision=revision)
+        try:
+            return None, remote_path, self._fetch_file_metadata(remote_path, revision=revision)
+        except EntryNotFoundError:
+            if codec is None:
+                raise
+        existing = self._fetch_remote_oids([remote_path + suffix for suffix, _, _ in CODECS.values()],
+                                           revision=revision)
+        for name, (suffix, _, _) in CODECS.items():
+            if remote_path + suffix in existing:
+                return name, remote_path + suffix, self._fetch_file_metadata(remote_path + suffix, revision=revision)
+        raise EntryNotFoundError(f"云端不存在 {remote_path} 或其压缩版本")
+
+    def _restore_compressed(self, remote_path, local_path, codec, stored_path, meta, force, mode, fsync):
+        result = {"status": "failed", "remote_path": remote_path, "commit": meta.commit_hash, "error": None}
+        entry = self.manifest.get(remote_path, {})
+        if (not force and os.path.isfile(local_path) and entry.get("codec") == codec
+                and meta.etag in entry.get("remote_oids", [])
+                and self._local_digest(local_path, remote_path)["sha256"] == entry.get("sha256")):
+            print(f"[OK] 云端未变化 (commit {str(meta.commit_hash)[:8]})，跳过下载。")
+            result["status"] = "skipped"
+            return result
+
+        print(f"[*] 正在从云端拉取文件 ({self.dataset_id}): {stored_path} [{codec}]...")
+        revision = meta.commit_hash or "main"
+        if mode == "direct":
+            target = Path(local_path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, packed = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.", suffix=CODECS[codec][0])
+            os.close(fd)
+            try:
+                self._download_direct(stored_path, revision, packed)
+                atomic_install(local_path, lambda tmp: decompress_file(packed, tmp, codec), fsync=fsync)
+            finally:
+                os.remove(packed)
+        else:
+            packed = hf_hub_download(
+                repo_id=self.dataset_id,
+                repo_type="dataset",
+                filename=stored_path,
+                token=self.api.token,
+                revision=revision,
+            )
+            atomic_install(local_path, lambda tmp: decompress_file(packed, tmp, codec), fsync=fsync)
+
+        digest = file_digest(local_path)
+        self._record(local_path, remote_path, {**digest, "codec": codec, "remote_oids": [meta.etag]},
+                     commit=meta.commit_hash, etag=meta.etag)
+        result["status"] = "restored"
+        print(f"[OK] 文件已解压恢复: {local_path} (Size: {digest['size']} bytes)")
+        return result
+
+    def restore(self, remote_path, local_path, is_folder=False, force=False, mode="cache", fsync="file",
+                chunked=False, codec="auto", at=None):
+        """
+        从 Dataset 恢复数据到本地。单文件会先做元数据比对，云端未变化且本地文件完好时跳过下载。
+        单文件总是先写入目标旁的临时文件，再原子 rename 覆盖，不会留下写了一半的文件。
         :param remote_path: Dataset 里的路径（如 'db/data.sqlite'）
         :param local_path: 本地存放的路径
         :param is_folder: 是否是文件夹。如果是文件夹，会尝试下载整个目录内容。
+        :param force: 跳过元数据比对，强制重新下载
+        :param mode: "cache" 经 hub 缓存后 reflink/流式复制；"direct" 绕过缓存直接流式下载到目标旁
+                     （大文件、小磁盘推荐）；"hardlink" 与缓存硬链接（零拷贝，仅限只读文件）
+        :param fsync: 落盘策略，"none" / "file" / "full"
+        :param chunked: 云端为分块格式（由 save(..., chunked=True) 写入）。本地已有旧文件时会逐块比对以复用相同内容，
+                        变化区域的扫描为纯 Python (约 5-6 MB/s)；与目标大小相差超过 CHUNK_REUSE_MAX_RATIO 倍时不扫描、全部下载
+        :param codec: "auto" 按云端文件后缀自动识别压缩格式；None 只查找原始文件；也可显式指定编解码器
+        :param at: 时间点（Unix 时间戳 / datetime / ISO 字符串），恢复该时刻之前最后一次提交的版本；
+                   版本由本地历史索引定位（见 history()），存储格式按当时的版本自动识别
+        :return: {"status": "restored" | "skipped" | "failed", "remote_path": ..., "commit": ..., "error": ...}
         """
+        if mode not in RESTORE_MODES:
+            raise ValueError(f"未知的恢复模式: {mode}，可选: {RESTORE_MODES}")
+        if at is not None and is_folder:
+            raise ValueError("按时间点恢复仅支持单文件")
         print(f"正在从 [{self.dataset_id}] 恢复数据: {remote_path} -> {local_path}...")
+        result = {"status": "failed", "remote_path": remote_path, "commit": None, "error": None}
         try:
+            revision = "main"
+            if at is not None:
+                version = self._version_at(remote_path, at)
+                revision = version["commit"]
+                chunked, codec = version["chunked"], version["codec"]
+                print(f"[*] 回滚到 {version['date']} 的版本 (commit {revision[:8]}): {version['title']}")
+            if chunked:
+                return self._restore_chunked(remote_path, local_path, force=force, fsync=fsync, revision=revision)
             if is_folder:
                 # 确保本地目录存在
                 os.makedirs(local_path, exist_ok=True)
@@ -36,76 +969,601 @@ class PersistenceManager:
                     token=self.api.token
                 )
             else:
-                # 尝试拉取最新单文件
+                # 先用 HEAD 请求拿到云端当前版本，再决定是否需要下载
+                stored_codec, stored_path, meta = self._resolve_stored(remote_path, codec, revision=revision)
+                if stored_codec:
+                    return self._restore_compressed(remote_path, local_path, stored_codec, stored_path, meta,
+                                                    force, mode, fsync)
+                result["commit"] = meta.commit_hash
+                if not force and os.path.isfile(local_path):
+                    digest = self._local_digest(local_path, remote_path)
+                    if meta.etag in (digest["sha256"], digest["git_oid"]):
+                        self._record(local_path, remote_path, digest, commit=meta.commit_hash, etag=meta.etag)
+                        print(f"[OK] 云端未变化 (commit {str(meta.commit_hash)[:8]})，跳过下载。")
+                        result["status"] = "skipped"
+                        return result
+
                 print(f"[*] 正在从云端拉取文件 ({self.dataset_id}): {remote_path}...")
-                
-                # 下载单文件 (强制刷新缓存)
-                downloaded_path = hf_hub_download(
-                    repo_id=self.dataset_id,
-                    repo_type="dataset",
-                    filename=remote_path,
-                    token=self.api.token,
-                    force_download=True,
-                    revision="main" 
-                )
-                
-                # 复制并验证
-                target = Path(local_path)
-                target.parent.mkdir(parents=True, exist_ok=True)
-                shutil.copy(downloaded_path, local_path)
+                # 固定到 HEAD 请求返回的 commit，下载与比对针对同一版本
+                revision = meta.commit_hash or revision
+                if mode == "direct":
+                    digests = []
+                    atomic_install(
+                        local_path,
+                        lambda tmp: digests.append(self._download_direct(remote_path, revision, tmp)),
+                        fsync=fsync,
+                    )
+                    digest = digests[0]
+                else:
+                    self._install_from_cache(remote_path, revision, local_path, mode, fsync)
+                    digest = file_digest(local_path)
+                self._record(local_path, remote_path, digest, commit=meta.commit_hash, etag=meta.etag)
                 
                 file_size = os.path.getsize(local_path)
                 print(f"[OK] 文件已更新: {local_path} (Size: {file_size} bytes)")
             
+            result["status"] = "restored"
             print("[OK] 恢复完成。")
         except Exception as e:
+            result["error"] = str(e)
             print(f"[Warning] 恢复错误: {e}")
+        return result
 
-    def save(self, local_path, remote_path, is_folder=False, commit_message="Persist data from Space"):
+    def save(self, local_path, remote_path, is_folder=False, commit_message="Persist data from Space", force=False,
+             chunked=False, codec=None):
         """
-        将本地数据备份到 Dataset。
+        将本地数据备份到 Dataset。内容未变化时跳过提交。
         :param local_path: 本地待备份的路径
         :param remote_path: Dataset 里的保存路径
-        :param is_folder: 是否是整个文件夹
+        :param is_folder: 是否是整个文件夹（增量同步，详见 sync_folder）
+        :param force: 忽略哈希比对，强制提交
+        :param chunked: 使用分块格式，大文件的小改动只上传变化的块（恢复时需传 chunked=True）。
+                        首次分块需要纯 Python 完整扫描 (约 5-6 MB/s，GB 级文件需数分钟)，之后只扫描变化的区域
+        :param codec: 压缩后再上传 ("gzip" / "zstd" / "lz4" 或已注册的编解码器)，云端路径追加对应后缀
+        :return: {"status": "uploaded" | "skipped" | "failed", "remote_path": ..., "commit": ..., "error": ...}
         """
         print(f"正在备份到 [{self.dataset_id}]: {local_path} -> {remote_path}...")
+        result = {"status": "failed", "remote_path": remote_path, "commit": None, "error": None}
         try:
-            if is_folder:
-                self.api.upload_folder(
+            if is_folder and force:
+                commit_info = self.api.upload_folder(
                     folder_path=local_path,
                     path_in_repo=remote_path,
                     repo_id=self.dataset_id,
                     repo_type="dataset",
                     commit_message=commit_message
                 )
+                commit = getattr(commit_info, "oid", None)
+            elif is_folder:
+                return self.sync_folder(local_path, remote_path, commit_message=commit_message)
             else:
-                self.api.upload_file(
-                    path_or_fileobj=local_path,
-                    path_in_repo=remote_path,
-                    repo_id=self.dataset_id,
-                    repo_type="dataset",
-                    commit_message=commit_message
-                )
+                if chunked:
+                    plan = self._plan_chunked(local_path, remote_path, force=force)
+                elif codec:
+                    plan = self._plan_compressed(local_path, remote_path, codec, force=force)
+                else:
+                    plan = self._plan_file(local_path, remote_path, force=force)
+                commit = self._commit_plans([plan], commit_message)
+                if not plan["operations"]:
+                    print("[OK] 内容未变化，跳过提交。")
+                    result["status"] = "skipped"
+                    return result
+            result.update(status="uploaded", commit=commit)
             print("[OK] 备份成功。")
         except Exception as e:
+            result["error"] = str(e)
             print(f"[Error] 备份失败: {e}")
+        return result
+
+    @staticmethod
+    def _normalize_mapping(mapping):
+        """
+        (remote_path, local_path[, is_folder[, options]]) -> (remote_path, local_path, is_folder, options)
+        options 为该路径的存储选项 {"codec": ..., "chunked": ..., "fsync": ...}，save_many / restore_many 共用。
+        """
+        remote_path, local_path = mapping[0], mapping[1]
+        is_folder = bool(mapping[2]) if len(mapping) > 2 else False
+        options = dict(mapping[3]) if len(mapping) > 3 and mapping[3] else {}
+        unknown = set(options) - MAPPING_OPTIONS
+        if unknown:
+            raise ValueError(f"未知的路径选项: {sorted(unknown)}，可选: {sorted(MAPPING_OPTIONS)}")
+        return remote_path, local_path, is_folder, options
+
+    def restore_many(self, mappings, max_workers=BATCH_WORKERS, force=False, mode="cache", **restore_kwargs):
+        """
+        并行恢复多个路径，线程池大小有上限，各线程复用同一个连接池。
+        :param mappings: [(remote_path, local_path[, is_folder[, options]]), ...]，与 save_many 相同，可共用同一份配置；
+                         options 中的 codec / chunked / fsync 原样传给 restore()
+        :param restore_kwargs: 所有路径共用的 restore() 参数 (fsync / chunked / codec)，被单个路径的 options 覆盖
+        :return: 与 mappings 顺序一致的 restore() 结果列表，单个路径失败不影响其他路径
+        """
+        items = [self._normalize_mapping(m) for m in mappings]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(self.restore, rp, lp, is_folder=is_folder, force=force, mode=mode,
+                                **{**restore_kwargs, **options})
+                for rp, lp, is_folder, options in items
+            ]
+            return [f.result() for f in futures]
+
+    def save_many(self, mappings, commit_message="Persist data from Space", force=False, max_workers=BATCH_WORKERS):
+        """
+        把多个路径合并为一次原子 commit 备份。各路径的变更检测并行进行，内容未变化的路径不进入 commit。
+        :param mappings: [(remote_path, local_path[, is_folder[, options]]), ...]；options 中的 codec / chunked
+                         与 save() 同名参数含义相同 (fsync 只用于恢复，这里忽略)
+        :return: 与 mappings 顺序一致的结果列表，每项同 save() 的返回值
+        """
+        items = [self._normalize_mapping(m) for m in mappings]
+        results = [{"status": "failed", "remote_path": rp, "commit": None, "error": None} for rp, _, _, _ in items]
+        plans = [None] * len(items)
+
+        def plan(rp, lp, is_folder, options):
+            if is_folder:
+                return self._plan_folder(lp, rp)
+            if options.get("chunked"):
+                return self._plan_chunked(lp, rp, force=force)
+            if options.get("codec") not in (None, "auto"):
+                return self._plan_compressed(lp, rp, options["codec"], force=force)
+            return self._plan_file(lp, rp, force=force)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(plan, *item): i for i, item in enumerate(items)}
+            for future in concurrent.futures.as_completed(futures):
+                i = futures[future]
+                try:
+                    plans[i] = future.result()
+                except Exception as e:
+                    results[i]["error"] = str(e)
+                    print(f"[Error] 无法处理 {items[i][1]}: {e}")
+
+        ready = [i for i, p in enumerate(plans) if p is not None]
+        try:
+            commit = self._commit_plans([plans[i] for i in ready], commit_message)
+        except Exception as e:
+            print(f"[Error] 批量备份失败: {e}")
+            for i in ready:
+                results[i]["error"] = str(e)
+            return results
+
+        for i in ready:
+            changed = bool(plans[i]["operations"])
+            results[i].update(status="uploaded" if changed else "skipped", commit=commit if changed else None)
+            if items[i][2]:
+                results[i].update(plans[i]["counts"])
+        uploaded = sum(1 for r in results if r["status"] == "uploaded")
+        failed = sum(1 for r in results if r["status"] == "failed")
+        print(f"[OK] 批量备份完成: 上传 {uploaded}，跳过 {len(results) - uploaded - failed}，失败 {failed}。")
+        return results
+
+    def save_sqlite(self, db_path, remote_path, commit_message="Persist SQLite snapshot from Space",
+                    method="backup", force=False, codec=None):
+        """
+        以一致性快照的方式备份正在使用的 SQLite 数据库，避免上传到写了一半的页面。
+        支持 WAL 模式，备份期间应用可以继续读写。
+        :param method: "backup" (在线备份 API) 或 "vacuum" (VACUUM INTO)
+        :param codec: 同 save()，SQLite 文件通常可压缩 5-10 倍
+        :return: 同 save()
+        """
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        snapshot = self.state_dir / f"snapshot-{os.getpid()}-{threading.get_ident()}.sqlite"
+        try:
+            print(f"[*] 正在生成 SQLite 快照 ({method}): {db_path}...")
+            snapshot_sqlite(db_path, snapshot, method=method)
+            ok, detail = check_sqlite(snapshot)
+            if not ok:
+                print(f"[Error] 快照完整性检查失败: {detail}")
+                return {"status": "failed", "remote_path": remote_path, "commit": None, "error": detail}
+            return self.save(str(snapshot), remote_path, commit_message=commit_message, force=force, codec=codec)
+        finally:
+            if snapshot.exists():
+                snapshot.unlink()
+
+    def restore_sqlite(self, remote_path, db_path, force=False, mode="direct", at=None, chunked=False):
+        """
+        恢复 SQLite 数据库：先下载到目标旁的临时文件并执行完整性检查，通过后再原子替换。
+        请在应用打开数据库连接之前调用（会清理残留的 -wal / -shm 文件）。
+        :param at: 回滚到该时间点之前的最后一个版本，同 restore()；存储格式 (压缩/分块) 按该版本自动识别
+        :param chunked: 云端当前为分块格式，同 restore()
+        :return: 同 restore()
+        """
+        result = {"status": "failed", "remote_path": remote_path, "commit": None, "error": None}
+        staging = f"{db_path}.restore"
+        try:
+            codec, revision = "auto", "main"
+            if at is not None:
+                version = self._version_at(remote_path, at)
+                chunked, codec, revision = version["chunked"], version["codec"], version["commit"]
+            if chunked:
+                # 分块格式以清单文件代表一个版本，与 restore() 走同一条路径
+                meta = self._fetch_file_metadata(remote_path + CHUNK_MANIFEST_SUFFIX, revision=revision)
+            else:
+                _, _, meta = self._resolve_stored(remote_path, codec, revision=revision)
+            result["commit"] = meta.commit_hash
+            entry = self.manifest.get(remote_path, {})
+            known = (entry.get("etag"), entry.get("sha256"), entry.get("git_oid"), *entry.get("manifest_oids", []))
+            if not force and os.path.exists(db_path) and meta.etag in known:
+                print(f"[OK] 云端数据库未变化 (commit {str(meta.commit_hash)[:8]})，跳过恢复。")
+                result["status"] = "skipped"
+                return result
+
+            res = self.restore(remote_path, staging, force=True, mode=mode, at=at, chunked=chunked)
+            if res["status"] != "restored":
+                raise RuntimeError(res["error"])
+            ok, detail = check_sqlite(staging)
+            if not ok:
+                raise RuntimeError(f"下载的数据库未通过完整性检查: {detail}")
+
+            # 旧库的 WAL 若残留，会被错误地回放到新库上
+            for suffix in ("-wal", "-shm", "-journal"):
+                if os.path.exists(db_path + suffix):
+                    os.remove(db_path + suffix)
+            os.replace(staging, db_path)
+            entry = self.manifest.get(remote_path, {})
+            digest = {k: entry[k] for k in ("sha256", "git_oid", "size", "codec", "remote_oids",
+                                            "format", "chunks", "manifest_oids") if k in entry}
+            self._record(db_path, remote_path, digest, commit=meta.commit_hash, etag=meta.etag)
+            result["status"] = "restored"
+            print(f"[OK] 数据库已恢复并通过完整性检查: {db_path}")
+        except Exception as e:
+            result["error"] = str(e)
+            print(f"[Warning] 数据库恢复错误: {e}")
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+        return result
+
+    def _open_history(self):
+        """
+        打开本地历史索引 (state_dir/history.sqlite)：
+        commits 按 main 分支从旧到新编号 seq；versions 记录每个存储路径在哪个 commit 发生变化；
+        tracked 记录已纳入索引的逻辑路径以及扫描到的 seq。
+        """
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.state_dir / HISTORY_DB_NAME, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS commits (
+                sha TEXT PRIMARY KEY, seq INTEGER UNIQUE NOT NULL, ts REAL NOT NULL, title TEXT);
+            CREATE TABLE IF NOT EXISTS versions (
+                path TEXT NOT NULL, sha TEXT NOT NULL, seq INTEGER NOT NULL, oid TEXT, size INTEGER,
+                PRIMARY KEY (path, sha));
+            CREATE INDEX IF NOT EXISTS versions_path_seq ON versions (path, seq);
+            CREATE TABLE IF NOT EXISTS tracked (path TEXT PRIMARY KEY, scanned_seq INTEGER NOT NULL DEFAULT 0);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        return conn
+
+    @staticmethod
+    def _stored_variants(remote_path):
+        """一个逻辑路径在云端可能的存放形式：原始文件、各压缩后缀、分块清单。"""
+        return ([remote_path] + [remote_path + suffix for suffix, _, _ in CODECS.values()]
+                + [remote_path + CHUNK_MANIFEST_SUFFIX])
+
+    def _track(self, conn, remote_paths):
+        """把路径纳入索引，返回其中新加入的数量。"""
+        added = 0
+        for remote_path in remote_paths:
+            added += conn.execute("INSERT OR IGNORE INTO tracked (path) VALUES (?)", (remote_path,)).rowcount
+        return added
+
+    def _fetch_new_commits(self, conn):
+        """
+        按 Link 头分页拉取 main 的提交列表（新到旧），遇到索引中已有的 commit 即停止。
+        返回 (新提交列表, 是否接上了已有索引)。
+        """
+        url = f"{self.api.endpoint}/api/datasets/{self.dataset_id}/commits/main"
+        headers = build_hf_headers(token=self.api.token)
+        new = []
+        while url:
+            r = self.http.get(url, headers=headers, timeout=(10, 60))
+            r.raise_for_status()
+            for item in r.json():
+                if conn.execute("SELECT 1 FROM commits WHERE sha = ?", (item["id"],)).fetchone():
+                    return new, True
+                new.append(item)
+            url = r.links.get("next", {}).get("url")
+        return new, False
+
+    def refresh_history(self, remote_paths=()):
+        """
+        增量刷新本地历史索引：只拉取上次索引之后的新提交；对每个跟踪的路径从最新版本出发，
+        借助 get_paths_info(expand=True) 返回的 last_commit 逐个版本回溯到已扫描的位置，
+        请求数与新增版本数成正比，而不是与提交总数成正比。
+        原始/压缩/分块几种存放形式一起回溯，切换格式（旧形式在同一 commit 中被删除）后仍能找到更早的版本。
+        :param remote_paths: 额外纳入索引的路径；清单中已备份过的路径总会被跟踪
+        :return: {"new_commits": int, "new_versions": int}
+        """
+        with self._lock:
+            logical = set(self.manifest) | set(remote_paths)
+        conn = self._open_history()
+        try:
+            self._track(conn, logical)
+            new, linked = self._fetch_new_commits(conn)
+            has_index = conn.execute("SELECT 1 FROM commits LIMIT 1").fetchone()
+            if new and has_index and not linked:
+                # 历史被改写（如 super_squash_history），旧索引作废，重新建立
+                print("[Warning] 云端提交历史已被改写，重建历史索引。")
+                conn.execute("DELETE FROM commits")
+                conn.execute("DELETE FROM versions")
+                conn.execute("UPDATE tracked SET scanned_seq = 0")
+            base = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM commits").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO commits (sha, seq, ts, title) VALUES (?, ?, ?, ?)",
+                [(item["id"], base + i + 1, _to_timestamp(item["date"]), item.get("title"))
+                 for i, item in enumerate(reversed(new))],
+            )
+            head_seq = base + len(new)
+
+            # 需要回溯的路径按 commit 分组，同一 commit 上的路径合并为一次请求；总是先处理最新的 commit
+            frontier = {}
+            for path, scanned in conn.execute("SELECT path, scanned_seq FROM tracked WHERE scanned_seq < ?", (head_seq,)):
+                frontier.setdefault(head_seq, {})[path] = scanned
+            pending = [path for paths in frontier.values() for path in paths]
+            new_versions = 0
+            while frontier:
+                seq = max(frontier)
+                batch = frontier.pop(seq)
+                sha = conn.execute("SELECT sha FROM commits WHERE seq = ?", (seq,)).fetchone()[0]
+                stored = [v for path in batch for v in self._stored_variants(path)]
+                infos = {}
+                for i in range(0, len(stored), 500):
+                    for info in self.api.get_paths_info(repo_id=self.dataset_id, paths=stored[i:i + 500],
+                                                        repo_type="dataset", revision=sha, expand=True):
+                        infos[info.path] = info
+                for path, scanned in batch.items():
+                    # 各存放形式在本版本之前最后一次变化的位置；都不存在时（尚未创建或已删除）回溯到此为止
+                    older = 0
+                    for variant in self._stored_variants(path):
+                        info = infos.get(variant)
+                        last_commit = getattr(info, "last_commit", None)
+                        row = last_commit and conn.execute(
+                            "SELECT seq FROM commits WHERE sha = ?", (last_commit.oid,)).fetchone()
+                        if not row or row[0] <= scanned:
+                            continue
+                        # 回溯到更早的 commit 时，未变化的其他存放形式会再次返回同一个版本，只统计首次写入
+                        new_versions += conn.execute(
+                            "INSERT OR IGNORE INTO versions (path, sha, seq, oid, size) VALUES (?, ?, ?, ?, ?)",
+                            (variant, last_commit.oid, row[0], remote_oid(info), getattr(info, "size", None)),
+                        ).rowcount
+                        older = max(older, row[0] - 1)
+                    if older > scanned:
+                        frontier.setdefault(older, {})[path] = scanned
+            conn.executemany("UPDATE tracked SET scanned_seq = ? WHERE path = ?", [(head_seq, p) for p in pending])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed_at', ?)", (str(time.time()),))
+            conn.commit()
+            return {"new_commits": len(new), "new_versions": new_versions}
+        finally:
+            conn.close()
+
+    def history(self, remote_path, max_age=HISTORY_MAX_AGE):
+        """
+        列出文件的历史版本（新到旧），查询完全在本地索引中完成。
+        索引超过 max_age 秒未刷新、或首次查询该路径时会先增量刷新；刷新失败时返回已有索引。
+        :param remote_path: 逻辑路径（与 save() 相同，压缩/分块存放的版本会合并列出）
+        :param max_age: 索引最大缓存时间（秒），None 表示只读本地索引
+        :return: [{"commit", "timestamp", "date", "title", "stored_path", "codec", "chunked", "oid", "size"}, ...]
+        """
+        conn = self._open_history()
+        try:
+            added = self._track(conn, [remote_path])
+            conn.commit()
+            row = conn.execute("SELECT value FROM meta WHERE key = 'refreshed_at'").fetchone()
+            stale = max_age is not None and (row is None or time.time() - float(row[0]) > max_age)
+        finally:
+            conn.close()
+        if added or stale:
+            try:
+                self.refresh_history([remote_path])
+            except Exception as e:
+                print(f"[Warning] 无法刷新历史索引，使用本地缓存: {e}")
+
+        variants = self._stored_variants(remote_path)
+        suffixes = {remote_path + suffix: name for name, (suffix, _, _) in CODECS.items()}
+        conn = self._open_history()
+        try:
+            rows = conn.execute(
+                f"SELECT v.path, v.sha, c.ts, c.title, v.oid, v.size FROM versions v JOIN commits c ON c.sha = v.sha "
+                f"WHERE v.path IN ({','.join('?' * len(variants))}) ORDER BY v.seq DESC",
+                variants,
+            ).fetchall()
+        finally:
+            conn.close()
+        return [{
+            "commit": sha,
+            "timestamp": ts,
+            "date": datetime.fromtimestamp(ts, timezone.utc).isoformat(),
+            "title": title,
+            "stored_path": path,
+            "codec": suffixes.get(path),
+            "chunked": path.endswith(CHUNK_MANIFEST_SUFFIX),
+            "oid": oid,
+            "size": size,
+        } for path, sha, ts, title, oid, size in rows]
+
+    def _version_at(self, remote_path, at):
+        """at 时刻之前（含）最后一次提交的版本。"""
+        ts = _to_timestamp(at)
+        for version in self.history(remote_path):
+            if version["timestamp"] <= ts:
+                return version
+        raise LookupError(f"{remote_path} 在 {at} 之前没有历史版本")
+
+
+class WriteBehindSaver:
+    """
+    写后 (write-behind) 持久化服务：调用方只需 mark_dirty()，后台线程在合并窗口结束后
+    把所有脏路径合并为一次 commit 上传，请求处理路径上永远不会等待 Hub 提交。
+    - window: 第一次标脏后等待多少秒再提交，窗口内的后续修改会被合并
+    - max_commits_per_hour: 每小时最多提交次数，避免触发 Hub 429 限流（退出时的最终 flush 不受限制）
+    - 进程退出 (atexit) 或收到 SIGTERM 时会立即 flush，Space 关停不丢数据
+    """
+    def __init__(self, manager, window=30, max_commits_per_hour=60,
+                 commit_message="Write-behind persist from Space", handle_signals=True):
+        self.pm = manager
+        self.window = window
+        self.max_commits_per_hour = max_commits_per_hour
+        self.commit_message = commit_message
+        self.handle_signals = handle_signals
+        self.last_result = None
+
+        self._dirty = {}  # remote_path -> (local_path, is_folder)
+        self._first_dirty_at = None
+        self._commit_times = collections.deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.RLock()
+        self._stopped = False
+        self._thread = None
+        self._prev_sigterm = None
+        # 退出钩子与 SIGTERM 处理只安装一次，stop() 后再次 start() 不会重复注册
+        self._hooks_installed = False
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="hf-write-behind", daemon=True)
+        self._thread.start()
+        if not self._hooks_installed:
+            self._hooks_installed = True
+            atexit.register(self.stop)
+            if self.handle_signals and threading.current_thread() is threading.main_thread():
+                self._prev_sigterm = signal.signal(signal.SIGTERM, self._on_sigterm)
+        return self
+
+    def mark_dirty(self, local_path, remote_path, is_folder=False):
+        """标记路径待上传，立即返回。"""
+        with self._cond:
+            self._dirty[remote_path] = (local_path, is_folder)
+            if self._first_dirty_at is None:
+                self._first_dirty_at = time.monotonic()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return dict(self._dirty)
+
+    def _rate_limit_wait(self, now):
+        """距离允许下一次提交还需等待的秒数。"""
+        while self._commit_times and now - self._commit_times[0] >= 3600:
+            self._commit_times.popleft()
+        if len(self._commit_times) < self.max_commits_per_hour:
+            return 0
+        return 3600 - (now - self._commit_times[0])
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if self._dirty:
+                        now = time.monotonic()
+                        wait = max(self._first_dirty_at + self.window - now, self._rate_limit_wait(now))
+                        if wait <= 0:
+                            break
+                        self._cond.wait(wait)
+                    else:
+                        self._cond.wait()
+                if self._stopped:
+                    return
+            self.flush()
+
+    def flush(self):
+        """
+        立即把当前所有脏路径合并为一次 commit。失败的路径会重新排队，等待下一个窗口重试。
+        :return: {"status": "uploaded" | "skipped" | "failed", "paths": [...], "commit": ..., "error": ...}
+        """
+        with self._flush_lock:
+            with self._cond:
+                batch = self._dirty
+                self._dirty = {}
+                self._first_dirty_at = None
+            if not batch:
+                return {"status": "skipped", "paths": [], "commit": None, "error": None}
+
+            mappings = [(rp, lp, is_folder) for rp, (lp, is_folder) in batch.items()]
+            results = self.pm.save_many(mappings, commit_message=self.commit_message)
+            commit = next((r["commit"] for r in results if r["commit"]), None)
+            failed = [r for r in results if r["status"] == "failed"]
+            if commit:
+                self._commit_times.append(time.monotonic())
+                print(f"[OK] 后台合并提交 {len(batch)} 个路径 (commit {commit[:8]})。")
+            if failed:
+                print(f"[Error] {len(failed)} 个路径后台备份失败，将在下个窗口重试。")
+                with self._cond:
+                    for r in failed:
+                        rp = r["remote_path"]
+                        lp, is_folder = batch[rp]
+                        if os.path.exists(lp):
+                            self._dirty.setdefault(rp, (lp, is_folder))
+                    if self._dirty and self._first_dirty_at is None:
+                        self._first_dirty_at = time.monotonic()
+            status = "failed" if failed else ("uploaded" if commit else "skipped")
+            result = {
+                "status": status,
+                "paths": sorted(batch),
+                "commit": commit,
+                "error": "; ".join(r["error"] for r in failed) or None,
+            }
+            self.last_result = result
+            return result
+
+    def stop(self, flush=True):
+        """停止后台线程；默认在退出前执行最后一次 flush。"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        if flush:
+            return self.flush()
+
+    def _on_sigterm(self, signum, frame):
+        print("[*] 收到 SIGTERM，正在保存未提交的数据...")
+        self.stop()
+        prev = self._prev_sigterm
+        if callable(prev):
+            prev(signum, frame)
+        else:
+            # 恢复原处理方式后重新投递信号，保持默认的退出行为
+            signal.signal(signal.SIGTERM, prev if prev is not None else signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
 
 if __name__ == "__main__":
     # 简单的 CLI 测试示例
     print("Persistence Manager CLI...")
     # 用法示例：python persistence_manager.py save data.db db/data.db
     import sys
+    if len(sys.argv) == 3 and sys.argv[1] == "history":
+        for v in PersistenceManager().history(sys.argv[2]):
+            print(f"{v['date']}  {v['commit'][:8]}  {v['size'] or '-':>10}  {v['stored_path']}  {v['title'] or ''}")
+        sys.exit(0)
     if len(sys.argv) < 4:
-        print("用法: python persistence_manager.py [save|restore] <local_path> <remote_path> [--folder]")
+        print("用法: python persistence_manager.py [save|restore] <local_path> <remote_path> [--folder|--sqlite|--chunked] [--force] [--direct|--hardlink] [--codec=gzip|zstd|lz4] [--at=时间点]")
+        print("      python persistence_manager.py history <remote_path>")
         sys.exit(0)
     
     op = sys.argv[1]
     lp = sys.argv[2]
     rp = sys.argv[3]
     is_f = "--folder" in sys.argv
+    codec = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--codec=")), None)
+    at = next((a.split("=", 1)[1] for a in sys.argv if a.startswith("--at=")), None)
+    if at and at.replace(".", "", 1).isdigit():
+        at = float(at)
     
     mgr = PersistenceManager() # 会自动读取环境变量
-    if op == "save":
-        mgr.save(lp, rp, is_folder=is_f)
+    if op == "save" and "--sqlite" in sys.argv:
+        res = mgr.save_sqlite(lp, rp, force="--force" in sys.argv)
+        print(f"结果: {res['status']}")
+    elif op == "restore" and "--sqlite" in sys.argv:
+        res = mgr.restore_sqlite(rp, lp, force="--force" in sys.argv, at=at)
+        print(f"结果: {res['status']}")
+    elif op == "save":
+        res = mgr.save(lp, rp, is_folder=is_f, force="--force" in sys.argv, chunked="--chunked" in sys.argv,
+                       codec=codec)
+        print(f"结果: {res['status']}")
     elif op == "restore":
-        mgr.restore(rp, lp, is_folder=is_f)
+        mode = "direct" if "--direct" in sys.argv else ("hardlink" if "--hardlink" in sys.argv else "cache")
+        res = mgr.restore(rp, lp, is_folder=is_f, force="--force" in sys.argv, mode=mode,
+                          chunked="--chunked" in sys.argv, codec=codec or "auto", at=at)
+        print(f"结果: {res['status']}")
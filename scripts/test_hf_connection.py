@@ -1,10 +1,10 @@
 import os
-import requests
 import sys
+from hf_client import http_session, remember_username, HTTP_ERRORS
 
 def fetch_count(url, headers):
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_session().get(url, headers=headers, timeout=10)
         if response.status_code == 200:
             data = response.json()
             # 返回总数和前3个项目的名称
@@ -32,8 +32,9 @@ def test_connection():
     
     try:
         # 请求 Hugging Face whoami 端点
+        # 与后续请求共用同一个 keep-alive 会话，只做一次 TLS 握手
         url = "https://huggingface.co/api/whoami-v2"
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http_session().get(url, headers=headers, timeout=10)
         
         if response.status_code == 200:
             user_data = response.json()
@@ -42,6 +43,8 @@ def test_connection():
             email = user_data.get("email", "未公开邮箱")
             
             print(f"✅ 连接成功! 认证用户: {username} ({user_type})")
+            # 顺便写入用户名缓存，之后 manage_spaces / manage_datasets 解析短名称时无需再调用 whoami
+            remember_username(hf_token, username)
             print(f"✉️ 邮箱: {email}")
             
             # 获取并统计资源信息
@@ -76,7 +79,7 @@ def test_connection():
             print(f"详情: {response.text}")
             sys.exit(1)
             
-    except requests.exceptions.RequestException as e:
+    except HTTP_ERRORS as e:
         print(f"❌ 网络请求异常，无法连接到 HuggingFace API: {e}")
         sys.exit(1)
 